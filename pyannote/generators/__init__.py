@@ -29,3 +29,83 @@
 from ._version import get_versions
 __version__ = get_versions()['version']
 del get_versions
+
+
+import sys
+import importlib
+
+
+# public API, lazily imported from the submodule it lives in so that
+# "import pyannote.generators" does not load pyannote.core,
+# pyannote.database (or anything heavy) until it is actually needed.
+# submodules only import them where they are used, except for `fragment`
+# (whose generators are built around pyannote.core objects)
+_LAZY = {
+    'AliasTable': 'alias',
+    'BackgroundGenerator': 'background',
+    'batchify': 'batch',
+    'forever': 'batch',
+    'EndOfBatch': 'batch',
+    'BaseBatchGenerator': 'batch',
+    'FileBasedBatchGenerator': 'batch',
+    'InputOutputSignatureMismatch': 'batch',
+    'PlanCache': 'cache',
+    'cached_plan': 'cache',
+    'CorpusIndex': 'corpus',
+    'CorpusLabelSampler': 'corpus',
+    'count_fragments': 'corpus',
+    'DurationIndex': 'duration',
+    'MemmapFeatures': 'features',
+    'strided_windows': 'features',
+    'SlidingSegments': 'fragment',
+    'TwinSlidingSegments': 'fragment',
+    'SlidingLabeledSegments': 'fragment',
+    'RandomLabeledSegments': 'fragment',
+    'RandomSegments': 'fragment',
+    'RandomSegmentsPerLabel': 'fragment',
+    'RandomTracks': 'fragment',
+    'RandomTrackTriplets': 'fragment',
+    'RandomSegmentTriplets': 'fragment',
+    'RandomSegmentPairs': 'fragment',
+    'LabelIndex': 'indices',
+    'index_labels': 'indices',
+    'load_label_index': 'indices',
+    'random_label_index': 'indices',
+    'random_label_batches': 'indices',
+    'random_pk_batches': 'indices',
+    'RandomStreams': 'rng',
+    'get_rng': 'rng',
+    'check_rng': 'rng',
+    'SegmentArray': 'segment',
+    'TrackIndex': 'segment',
+    'encode_labels': 'segment',
+    'start_reporting': 'stats',
+    'stop_reporting': 'stats',
+    'start_tracing': 'trace',
+    'stop_tracing': 'trace',
+}
+
+__all__ = sorted(_LAZY)
+
+
+def __getattr__(name):
+    try:
+        module = _LAZY[name]
+    except KeyError:
+        msg = "module '{0}' has no attribute '{1}'"
+        raise AttributeError(msg.format(__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    # cache it so that __getattr__ is only called once per name
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+# module-level __getattr__ (PEP 562) is not supported before Python 3.7
+if sys.version_info < (3, 7):
+    for _name in _LAZY:
+        __getattr__(_name)
+    del _name
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+import numpy as np
+from .rng import get_rng
+
+
+class AliasTable(object):
+    """Walker's alias table for weighted random sampling
+
+    Built once in O(n), it allows to draw indices with probability
+    proportional to `weights` in O(1) per draw.
+
+    Weights can then be updated in O(1) per weight: the table is left as is
+    and draws are corrected by rejection sampling. It is only rebuilt when
+    too many draws would be rejected.
+
+    New weights can also be appended in amortized O(1) per weight: the
+    table reserves spare slots (never accepted until they are used) and is
+    only rebuilt, with a geometrically larger capacity, once they are full.
+
+    Parameters
+    ----------
+    weights : (n, ) array-like
+        Non-negative weights, with a strictly positive sum.
+
+    Usage
+    -----
+    >>> table = AliasTable([1., 2., 1.])
+    >>> indices = table.draw(size=100)
+    >>> table.update([0], [4.])
+    >>> table.extend([3.])
+    """
+
+    def __init__(self, weights):
+        super(AliasTable, self).__init__()
+        self.build(weights)
+
+    def build(self, weights, capacity=None):
+        """(Re)build alias table
+
+        Parameters
+        ----------
+        weights : (n, ) array-like
+        capacity : int, optional
+            Reserve `capacity - n` spare slots for weights added later with
+            `extend`. Defaults to no spare slot.
+        """
+
+        weights = np.array(weights, dtype=np.float64).reshape(-1)
+        n_weights = len(weights)
+        total = np.sum(weights)
+        if n_weights == 0 or np.any(weights < 0) or not total > 0:
+            raise ValueError(
+                '"weights" must be non-negative with a strictly positive sum.')
+
+        # spare slots have a current weight of zero (i.e. they are always
+        # rejected) until they are used. they are built with the largest
+        # weight (so that most new weights do not increase the rejection
+        # bound) unless this would make more than half of draws rejected.
+        capacity = n_weights if capacity is None else max(capacity,
+                                                           n_weights)
+        current = np.zeros(capacity, dtype=np.float64)
+        current[:n_weights] = weights
+        n_spare = capacity - n_weights
+        spare = min(np.max(weights), total / max(n_spare, 1))
+        weights = np.full(capacity, spare, dtype=np.float64)
+        weights[:n_weights] = current[:n_weights]
+        n = capacity
+        total_ = np.sum(weights)
+
+        # Vose's algorithm
+        prob = weights * (n / total_)
+        alias = np.arange(n)
+        small = list(np.where(prob < 1.)[0])
+        large = list(np.where(prob >= 1.)[0])
+        while small and large:
+            s, l = small.pop(), large[-1]
+            alias[s] = l
+            prob[l] -= 1. - prob[s]
+            if prob[l] < 1.:
+                small.append(large.pop())
+
+        # leftovers are only due to rounding errors
+        prob[small] = 1.
+        prob[large] = 1.
+
+        self.prob = prob
+        self.alias = alias
+
+        # weights the table was built with, and current weights
+        self.weights_ = weights
+        self.current_ = current
+        self.n_weights_ = n_weights
+        self.total_ = total_
+        self.total = total
+
+        # upper bound of weights / weights_ ratio (None when exact)
+        self.bound_ = None if capacity == n_weights else 1.
+
+    @property
+    def weights(self):
+        """Current weights"""
+        return self.current_[:self.n_weights_]
+
+    @property
+    def capacity(self):
+        return len(self.prob)
+
+    def __len__(self):
+        return self.n_weights_
+
+    def update(self, indices, weights):
+        """Update weights
+
+        Parameters
+        ----------
+        indices : (k, ) array-like
+            Indices of updated weights.
+        weights : (k, ) array-like
+            New (non-negative) weights.
+        """
+
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        weights = np.asarray(weights, dtype=np.float64).reshape(-1)
+        if np.any(weights < 0):
+            raise ValueError('"weights" must be non-negative.')
+
+        # repeated indices: last write wins, counted once in `total`
+        _, last = np.unique(indices[::-1], return_index=True)
+        last = len(indices) - 1 - last
+        indices, weights = indices[last], weights[last]
+
+        self.total += np.sum(weights) - np.sum(self.weights[indices])
+        self.weights[indices] = weights
+
+        self.check_bound(indices, weights)
+
+    def extend(self, weights):
+        """Append new weights
+
+        Parameters
+        ----------
+        weights : (k, ) array-like
+            New (non-negative) weights, indexed from `len(self)` onwards.
+        """
+
+        weights = np.asarray(weights, dtype=np.float64).reshape(-1)
+        if np.any(weights < 0):
+            raise ValueError('"weights" must be non-negative.')
+
+        n = self.n_weights_ + len(weights)
+
+        # no spare slot left: rebuild with 50% more capacity
+        if n > self.capacity:
+            self.build(np.hstack([self.weights, weights]),
+                       capacity=n + n // 2 + 1)
+            return
+
+        indices = np.arange(self.n_weights_, n)
+        self.current_[indices] = weights
+        self.total += np.sum(weights)
+        self.n_weights_ = n
+        self.check_bound(indices, weights)
+
+    def check_bound(self, indices, weights):
+        """Update rejection bound after `indices` got new `weights`"""
+
+        # weights that cannot be reached by rejection sampling
+        built = self.weights_[indices]
+        if np.any((built == 0) & (weights > 0)):
+            self.build(self.weights, capacity=self.capacity)
+            return
+
+        # other weights are (at least) unchanged
+        if len(weights):
+            ratio = np.max(weights / np.where(built > 0, built, 1.))
+            self.bound_ = max(1. if self.bound_ is None else self.bound_,
+                              ratio)
+
+        # rebuild when more than half of draws would be rejected
+        if self.bound_ is not None and \
+           self.total < .5 * self.bound_ * self.total_:
+            self.build(self.weights, capacity=self.capacity)
+
+    def _draw(self, size, rng):
+        i = rng.integers(len(self.prob), size=size)
+        keep = rng.random(size=size) < self.prob[i]
+        return np.where(keep, i, self.alias[i])
+
+    def draw(self, size=None, rng=None):
+        """Draw random indices
+
+        Parameters
+        ----------
+        size : int, optional
+            Number of indices. Defaults to drawing only one index.
+        rng : np.random.Generator, optional
+            Random generator. Defaults to numpy global random state.
+
+        Returns
+        -------
+        indices : int or (size, ) np.ndarray
+        """
+
+        rng = get_rng(rng)
+
+        if self.bound_ is None:
+            indices = self._draw(size, rng)
+            return indices if size is not None else int(indices)
+
+        # draw from alias table, and reject according to updated weights
+        n = 1 if size is None else size
+        indices = self._draw(n, rng)
+        redraw = np.arange(n)
+        while True:
+            i = indices[redraw]
+            accept = self.current_[i] / (self.bound_ * self.weights_[i])
+            redraw = redraw[rng.random(len(redraw)) >= accept]
+            if not len(redraw):
+                break
+            indices[redraw] = self._draw(len(redraw), rng)
+
+        return indices if size is not None else int(indices[0])
@@ -33,6 +33,10 @@
 import threading
 import sys
 import queue
+from .trace import span
+from .stats import add_queue
+from .stats import get_stats
+from .stats import nbytes
 
 
 class BackgroundGenerator(threading.Thread):
@@ -73,18 +77,27 @@ class BackgroundGenerator(threading.Thread):
     def __init__(self, generator, max_prefetch=1):
         super(BackgroundGenerator, self).__init__(daemon=True)
         self.queue_ = queue.Queue(max_prefetch)
+        add_queue(self.queue_)
         self.generator = generator
         self.start()
 
     def run(self):
         for item in self.generator:
-            self.queue_.put(item)
+            stats = get_stats()
+            if stats is not None:
+                stats.count('bytes_put', nbytes(item))
+            with span('put', cat='queue'):
+                self.queue_.put(item)
         self.queue_.put(None)
 
     def next(self):
-        next_item = self.queue_.get()
+        with span('get', cat='queue'):
+            next_item = self.queue_.get()
         if next_item is None:
             raise StopIteration
+        stats = get_stats()
+        if stats is not None:
+            stats.count('bytes_got', nbytes(next_item))
         return next_item
 
     def __next__(self):
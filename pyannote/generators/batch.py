@@ -27,10 +27,17 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 
+import queue
 import warnings
+import traceback
+import multiprocessing
 import numpy as np
-from pyannote.database.util import get_unique_identifier
 from .background import BackgroundGenerator
+from .rng import get_rng
+from .rng import RandomStreams
+from .trace import span
+from .trace import stop_tracing
+from .stats import get_stats
 
 
 class Singleton(type):
@@ -121,6 +128,16 @@ class BaseBatchGenerator(object):
 
         self.batch_generator_ = self.iter_batches()
 
+    def __getstate__(self):
+        # generators cannot be pickled (e.g. to be sent to worker processes)
+        state = dict(self.__dict__)
+        state.pop('batch_generator_', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.batch_generator_ = self.iter_batches()
+
     def init(self, signature=None):
         """Initialize new batch"""
 
@@ -151,7 +168,7 @@ class BaseBatchGenerator(object):
         if type(signature) in (list, tuple):
             for i, s, b, in zip(item, signature, batch):
                 self.push(i, s, batch=b, **kwargs)
-                return
+            return
 
         if '@' not in signature:
             for key in signature:
@@ -193,6 +210,35 @@ class BaseBatchGenerator(object):
         """Post-process current batch"""
         return batch
 
+    def length(self, signature=None, batch=None):
+        """Number of items in current batch"""
+
+        if signature is None:
+            signature = self.signature
+
+        if batch is None:
+            batch = self.batch_
+
+        if type(signature) in (list, tuple):
+            return self.length(signature[0], batch=batch[0])
+
+        if '@' not in signature:
+            key = next(iter(signature))
+            return self.length(signature[key], batch=batch[key])
+
+        return len(batch)
+
+    def pack_batch(self):
+        """Pack and post-process current batch"""
+        stats = get_stats()
+        if stats is not None:
+            stats.count('batches')
+            stats.count('items', self.length())
+        with span('pack', cat='batch'):
+            batch = self.pack(self.signature)
+        with span('postprocess', cat='batch'):
+            return self.postprocess(batch)
+
     def __iter__(self):
         return self
 
@@ -223,19 +269,17 @@ class BaseBatchGenerator(object):
 
             if complete:
                 if batch_size:
-                    batch = self.pack(self.signature)
-                    yield self.postprocess(batch)
+                    yield self.pack_batch()
                 self.batch_ = self.init(self.signature)
                 batch_size = 0
                 complete = False
 
         # yield last incomplete batch
         if batch_size > 0 and self.incomplete:
-            batch = self.pack(self.signature)
-            yield self.postprocess(batch)
+            yield self.pack_batch()
 
 
-def forever(iterable, shuffle=False):
+def forever(iterable, shuffle=False, rng=None):
     """Loop over the iterable indefinitely.
 
     Parameters
@@ -243,11 +287,15 @@ def forever(iterable, shuffle=False):
     iterable : iterable
     shuffle : bool, optional
         Shuffle iterable after each full consumption
+    rng : np.random.Generator or int, optional
+        Random generator (or its seed) used for shuffling.
+        Defaults to numpy global random state.
     """
+    rng = get_rng(rng)
     saved = list(iterable)
     while saved:
         if shuffle:
-            np.random.shuffle(saved)
+            rng.shuffle(saved)
         for element in saved:
               yield element
 
@@ -286,7 +334,8 @@ class FileBasedBatchGenerator(BaseBatchGenerator):
             yield batch
 
     def from_files(self, file_generator, infinite=False,
-                   robust=False, incomplete=False):
+                   robust=False, incomplete=False, rng=None,
+                   n_workers=0, prefetch=2):
         """Generate batches by looping over a (possibly infinite) set of files
 
         Parameters
@@ -305,32 +354,61 @@ class FileBasedBatchGenerator(BaseBatchGenerator):
             Set to True to yield final batch, even if its incomplete (i.e.
             smaller than requested batch size). Default behavior is to not
             yield incomplete final batch. Has no effect when infinite is True.
+        rng : np.random.Generator or int, optional
+            Random generator (or its seed) used to shuffle files when
+            `infinite` is True. Defaults to numpy global random state.
+        n_workers : int, optional
+            Distribute files across that many worker processes, each of them
+            preprocessing its own files and generating, processing and
+            packing their fragments. Defaults to do everything in the
+            current process. See `from_files_parallel`.
+        prefetch : int, optional
+            Number of batches each worker can prepare in advance.
+            Defaults to 2. Has no effect when n_workers is 0.
 
         See also
         --------
         pyannote.database
         """
 
+        if n_workers > 0:
+            for batch in self.from_files_parallel(
+                    file_generator, n_workers, infinite=infinite,
+                    robust=robust, incomplete=incomplete, rng=rng,
+                    prefetch=prefetch):
+                yield batch
+            return
+
         # create new empty batch
         self.batch_ = self.init(self.signature)
         batch_size = 0
 
         if infinite:
-            file_generator = forever(file_generator, shuffle=True)
+            file_generator = forever(file_generator, shuffle=True, rng=rng)
 
         for current_file in file_generator:
 
             try:
-                preprocessed_file = self.preprocess(current_file)
+                with span('preprocess', cat='file',
+                          uri=current_file.get('uri', None)):
+                    preprocessed_file = self.preprocess(current_file)
             except Exception as e:
                 if robust:
+                    from pyannote.database.util import get_unique_identifier
                     uri = get_unique_identifier(current_file)
                     msg = 'Cannot preprocess file "{uri}".'
                     warnings.warn(msg.format(uri=uri))
+                    stats = get_stats()
+                    if stats is not None:
+                        stats.count('failures')
                     continue
                 else:
                     raise e
 
+            stats = get_stats()
+            if stats is not None:
+                stats.count('files')
+
             for fragment in self.generator.from_file(preprocessed_file):
 
                 # add item to batch
@@ -340,19 +418,221 @@ class FileBasedBatchGenerator(BaseBatchGenerator):
 
                 # fixed batch size
                 if self.batch_size > 0 and batch_size == self.batch_size:
-                    batch = self.pack(self.signature)
-                    yield self.postprocess(batch)
+                    yield self.pack_batch()
                     self.batch_ = self.init(self.signature)
                     batch_size = 0
 
             # mono-batch
             if self.batch_size < 1:
-                batch = self.pack(self.signature)
-                yield self.postprocess(batch)
+                yield self.pack_batch()
                 self.batch_ = self.init(self.signature)
                 batch_size = 0
 
         # yield incomplete final batch
         if batch_size > 0 and batch_size < self.batch_size and incomplete:
-            batch = self.pack(self.signature)
-            yield self.postprocess(batch)
+            yield self.pack_batch()
+
+    def from_files_parallel(self, file_generator, n_workers,
+                            infinite=False, robust=False, incomplete=False,
+                            rng=None, prefetch=2, timeout=1.):
+        """Same as `from_files` with files distributed across processes
+
+        Files are split into `n_workers` shards, each of them processed by
+        `from_files` in a dedicated worker process. Complete batches are
+        packed (and post-processed) by workers and sent back as they come.
+
+        Items that do not fill a complete batch at the end of a shard are
+        sent back as (file, fragment) pairs, before preprocessing: they are
+        processed and packed into batches of exactly `batch_size` items by
+        the current process. This avoids sending processed items (e.g.
+        memory-mapped features) between processes.
+
+        Batches are yielded in the order workers produce them. Each worker
+        reseeds numpy global random state (with a seed drawn from `rng`),
+        so that workers draw different random numbers. Fragment generators
+        initialized with `RandomStreams` draw the same numbers for a given
+        file, whatever the worker processing it.
+
+        With the "spawn" start method (default on macOS and Windows), batch
+        generator, files, and batches must be picklable.
+
+        Pipeline statistics (see `start_reporting`) include files, batches
+        and items of all workers. Spans of worker processes are however not
+        traced (see `start_tracing`): only those of the current process are.
+
+        When the fragment generator gets audio durations from a
+        `DurationIndex` (source='audio'), durations of all files are looked
+        up (and saved) by the current process before workers start, so
+        that workers do not look them up again.
+
+        Parameters
+        ----------
+        file_generator : iterable
+        n_workers : int
+            Number of worker processes.
+        infinite, robust, incomplete, rng : optional
+            See `from_files`.
+        prefetch : int, optional
+            Number of batches each worker can prepare in advance.
+            Defaults to 2.
+        timeout : float, optional
+            Check that workers are still alive every `timeout` seconds while
+            waiting for batches. Defaults to 1s.
+        """
+
+        files = list(file_generator)
+        n_workers = max(1, min(n_workers, len(files)))
+
+        # durations looked up by workers would be lost when they exit
+        durations = getattr(self.generator, 'durations', None)
+        if durations is not None and \
+           getattr(self.generator, 'source', None) == 'audio':
+            durations.populate(files, n_jobs=n_workers)
+
+        seeds = get_rng(rng).integers(0, 2 ** 31, size=n_workers)
+
+        output = multiprocessing.Queue(maxsize=prefetch * n_workers)
+        workers = []
+        for w in range(n_workers):
+            worker_rng = rng.worker(w) if isinstance(rng, RandomStreams) \
+                         else int(seeds[w])
+            worker = multiprocessing.Process(
+                target=_from_files_worker,
+                args=(self, files[w::n_workers], output, infinite, robust,
+                      int(seeds[w]), worker_rng),
+                daemon=True)
+            worker.start()
+            workers.append(worker)
+
+        remainders = []
+        try:
+            n_done = 0
+            while n_done < n_workers:
+
+                try:
+                    kind, content, counts = output.get(timeout=timeout)
+                except queue.Empty:
+                    # workers killed (e.g. out of memory) never say so
+                    for w, worker in enumerate(workers):
+                        if worker.exitcode:
+                            msg = ('Worker {w} died unexpectedly '
+                                   '(exit code {code}).')
+                            raise RuntimeError(msg.format(
+                                w=w, code=worker.exitcode))
+                    continue
+
+                # files, batches and items processed by workers
+                stats = get_stats()
+                if stats is not None:
+                    for name, n in counts.items():
+                        stats.count(name, n)
+
+                if kind == 'batch':
+                    yield content
+                elif kind == 'remainder':
+                    remainders.extend(content)
+                elif kind == 'error':
+                    msg = 'Worker failed with the following error:\n{tb}'
+                    raise RuntimeError(msg.format(tb=content))
+                else:
+                    n_done += 1
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+
+        if self.batch_size < 1 or not remainders:
+            return
+
+        # process items left by workers and pack them into batches of
+        # exactly batch_size items
+        self.batch_ = self.init(self.signature)
+        batch_size = 0
+        previous_file, preprocessed_file = None, None
+        for current_file, fragment in remainders:
+            # files were preprocessed once already: they should not fail
+            if current_file is not previous_file:
+                preprocessed_file = self.preprocess(current_file)
+                previous_file = current_file
+            self.push(fragment, self.signature,
+                      current_file=preprocessed_file)
+            batch_size += 1
+            if batch_size == self.batch_size:
+                yield self.pack_batch()
+                self.batch_ = self.init(self.signature)
+                batch_size = 0
+
+        if batch_size > 0 and incomplete:
+            yield self.pack_batch()
+        self.batch_ = self.init(self.signature)
+
+
+class _FragmentRecorder(object):
+    """Fragment generator wrapper remembering (file, fragment) pairs
+
+    Used by worker processes of `from_files_parallel` to know which
+    (not yet preprocessed) file items of the current batch come from, and
+    to count preprocessed files (and failures).
+    """
+
+    def __init__(self, generator):
+        super(_FragmentRecorder, self).__init__()
+        self.generator = generator
+        self.current_file = None
+        self.items = []
+        self.counts = {'files': 0, 'failures': 0}
+
+    def preprocess(self, preprocess):
+        def recording_preprocess(current_file, **kwargs):
+            self.current_file = current_file
+            try:
+                preprocessed_file = preprocess(current_file, **kwargs)
+            except Exception:
+                self.counts['failures'] += 1
+                raise
+            self.counts['files'] += 1
+            return preprocessed_file
+        return recording_preprocess
+
+    def pop_counts(self, n_batches=0):
+        """Counts since last call, with `n_batches` batches of current items"""
+        counts = dict(self.counts)
+        if n_batches:
+            counts.update(batches=n_batches, items=len(self.items))
+        self.counts = {'files': 0, 'failures': 0}
+        return counts
+
+    def from_file(self, current_file, **kwargs):
+        for fragment in self.generator.from_file(current_file, **kwargs):
+            self.items.append((self.current_file, fragment))
+            yield fragment
+
+
+def _from_files_worker(batch_generator, files, output, infinite, robust,
+                       seed, rng):
+    """Worker process of `FileBasedBatchGenerator.from_files_parallel`"""
+
+    np.random.seed(seed)
+
+    # spans of workers are not traced: only their counters are sent back
+    stop_tracing()
+
+    # worker has its own copy of batch_generator: instrument it
+    recorder = _FragmentRecorder(batch_generator.generator)
+    batch_generator.generator = recorder
+    batch_generator.preprocess = recorder.preprocess(
+        batch_generator.preprocess)
+
+    try:
+        for batch in batch_generator.from_files(
+                files, infinite=infinite, robust=robust,
+                incomplete=False, rng=rng):
+            output.put(('batch', batch, recorder.pop_counts(n_batches=1)))
+            recorder.items = []
+        # (file, fragment) pairs that did not fill a complete batch
+        output.put(('remainder', recorder.items, recorder.pop_counts()))
+    except Exception:
+        output.put(('error', traceback.format_exc(), recorder.pop_counts()))
+
+    output.put(('done', None, recorder.pop_counts()))
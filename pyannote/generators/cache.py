@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+import sys
+import threading
+import collections
+import numpy as np
+
+
+class PlanCache(object):
+    """Least-recently-used cache of per-file plans, with a memory budget
+
+    Fragment generators spend a significant part of their time computing
+    the deterministic part of fragment generation (e.g. file support, list
+    of sliding windows, per-label timelines), again and again at every
+    epoch. When given a `PlanCache`, they compute it once per file and only
+    perform the random part at later epochs.
+
+    Parameters
+    ----------
+    max_memory : int, optional
+        Memory budget, in bytes. Least recently used plans are evicted when
+        it is exceeded. Defaults to 1GB.
+
+    Usage
+    -----
+    >>> cache = PlanCache(max_memory=2 ** 30)
+    >>> generator = SlidingSegments(duration=3.2, cache=cache)
+    """
+
+    def __init__(self, max_memory=2 ** 30):
+        super(PlanCache, self).__init__()
+        self.max_memory = max_memory
+        self.memory = 0
+        self.plans_ = collections.OrderedDict()
+        self.lock_ = threading.Lock()
+
+    def __getstate__(self):
+        # locks cannot be pickled (e.g. to be sent to worker processes)
+        state = dict(self.__dict__)
+        del state['lock_']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock_ = threading.Lock()
+
+    def get(self, key, compute):
+        """Get plan from cache (or compute it and store it in cache)
+
+        Parameters
+        ----------
+        key : hashable
+        compute : callable
+            Called without argument to compute plan in case of cache miss.
+
+        Returns
+        -------
+        plan : any
+            Numpy arrays contained in cached plans are made read-only.
+        """
+
+        with self.lock_:
+            if key in self.plans_:
+                self.plans_.move_to_end(key)
+                return self.plans_[key][0]
+
+        plan = compute()
+        memory = freeze(plan)
+
+        with self.lock_:
+            if key in self.plans_ or memory > self.max_memory:
+                return plan
+            self.plans_[key] = (plan, memory)
+            self.memory += memory
+            while self.memory > self.max_memory:
+                _, (_, memory) = self.plans_.popitem(last=False)
+                self.memory -= memory
+
+        return plan
+
+    def clear(self):
+        with self.lock_:
+            self.plans_.clear()
+            self.memory = 0
+
+    def __len__(self):
+        return len(self.plans_)
+
+    def __contains__(self, key):
+        return key in self.plans_
+
+
+def freeze(plan):
+    """Make numpy arrays of `plan` read-only and return its memory footprint"""
+
+    if isinstance(plan, np.ndarray):
+        plan.flags.writeable = False
+        return plan.nbytes
+
+    if isinstance(plan, (list, tuple)):
+        return sys.getsizeof(plan) + sum(freeze(p) for p in plan)
+
+    if isinstance(plan, dict):
+        return sys.getsizeof(plan) + sum(freeze(p) for p in plan.values())
+
+    if hasattr(plan, '__dict__'):
+        return sys.getsizeof(plan) + freeze(vars(plan))
+
+    return sys.getsizeof(plan)
+
+
+def cached_plan(generator, current_file, compute):
+    """Get per-file plan of a fragment generator
+
+    Parameters
+    ----------
+    generator : object
+        Fragment generator. Its `cache` attribute (a `PlanCache` instance,
+        or None to disable caching) is used to store plans.
+    current_file : dict
+    compute : callable
+        Called without argument to compute plan in case of cache miss.
+
+    Returns
+    -------
+    plan : any
+    """
+
+    cache = getattr(generator, 'cache', None)
+    if cache is None:
+        return compute()
+
+    # generator parameters (but cache, rng and durations) are part of the key
+    parameters = []
+    for name, value in sorted(vars(generator).items()):
+        if name in ('cache', 'rng', 'durations'):
+            continue
+        try:
+            hash(value)
+        except TypeError:
+            value = id(value)
+        parameters.append((name, value))
+
+    from pyannote.database.util import get_unique_identifier
+    key = (get_unique_identifier(current_file),
+           generator.__class__.__name__, tuple(parameters))
+    return cache.get(key, compute)
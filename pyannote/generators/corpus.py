@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+import threading
+import collections
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from .segment import SegmentArray
+from .rng import get_rng
+
+
+class CorpusIndex(object):
+    """Flat index of all fragments of a corpus
+
+    Walks a set of files once and stores every fragment generated by a
+    `SlidingSegments` or `SlidingLabeledSegments` instance in a flat columnar
+    table of (file_id, start, end, label_id). This allows random access to
+    (and uniform sampling over) all fragments of the corpus.
+
+    Parameters
+    ----------
+    generator : SlidingSegments or SlidingLabeledSegments
+        Fragment generator. Must implement `array_from_file`.
+    files : iterable
+        File generator yielding dictionaries at least containing the 'uri'
+        key. Typically, one would use the 'train' method of a protocol
+        available in pyannote.database.
+    n_jobs : int, optional
+        Number of threads used to build the index. Defaults to 1.
+
+    Attributes
+    ----------
+    files : list
+        List of files.
+    uris : list
+        Unique identifier of each file.
+    file_id : (n_fragments, ) np.ndarray
+        Index (in `files`) of the file each fragment comes from.
+    segments : SegmentArray
+        All fragments, labeled with corpus-level label identifiers when
+        `generator` yields labels.
+
+    Usage
+    -----
+    >>> generator = SlidingLabeledSegments(duration=3.2)
+    >>> index = CorpusIndex(generator, protocol.train(), n_jobs=4)
+    >>> len(index)
+    >>> current_file, (segment, label) = index[0]
+    >>> for current_file, (segment, label) in index.iter_shuffled():
+    ...     do_something(current_file, segment, label)
+    """
+
+    def __init__(self, generator, files, n_jobs=1):
+        super(CorpusIndex, self).__init__()
+        self.generator = generator
+        self.files = list(files)
+        from pyannote.database.util import get_unique_identifier
+        self.uris = [get_unique_identifier(f) for f in self.files]
+        self.n_jobs = n_jobs
+
+        if n_jobs > 1:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                arrays = list(executor.map(generator.array_from_file,
+                                           self.files))
+        else:
+            arrays = [generator.array_from_file(f) for f in self.files]
+
+        lengths = [len(a) for a in arrays]
+        self.file_id = np.repeat(np.arange(len(self.files), dtype=np.int32),
+                                 lengths)
+        self.segments = SegmentArray.concatenate(arrays)
+
+    @property
+    def start(self):
+        return self.segments.start
+
+    @property
+    def end(self):
+        return self.segments.end
+
+    @property
+    def label(self):
+        """Corpus-level label identifiers (None if unlabeled)"""
+        return self.segments.label
+
+    @property
+    def vocabulary(self):
+        """Corpus-level list of labels (None if unlabeled)"""
+        return self.segments.vocabulary
+
+    def __len__(self):
+        return len(self.file_id)
+
+    def __getitem__(self, i):
+        """Get `i`th fragment
+
+        Returns
+        -------
+        current_file : dict
+            File the fragment comes from.
+        fragment : Segment or (Segment, label) tuple
+            Same as what `generator.from_file` would yield.
+        """
+        return self.files[self.file_id[i]], self.segments[i]
+
+    def draw(self, size=None, rng=None):
+        """Draw fragment indices uniformly at random over the whole corpus"""
+        return get_rng(rng).integers(len(self), size=size)
+
+    def iter_shuffled(self, infinite=False, rng=None):
+        """Iterate over fragments in random order
+
+        Parameters
+        ----------
+        infinite : bool, optional
+            Loop over the index indefinitely, reshuffling after each pass.
+            Defaults to a single pass.
+        rng : np.random.Generator or int, optional
+            Random generator (or its seed). Defaults to numpy global random
+            state.
+
+        Yields
+        ------
+        current_file : dict
+        fragment : Segment or (Segment, label) tuple
+        """
+        rng = get_rng(rng)
+        while len(self):
+            for i in rng.permutation(len(self)):
+                yield self[i]
+            if not infinite:
+                break
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def count_fragments(generator, files):
+    """Count fragments of a corpus without generating them
+
+    Bounds of all segments of the corpus are gathered first, so that the
+    number of windows is computed at once for the whole corpus.
+
+    Parameters
+    ----------
+    generator : SlidingSegments or SlidingLabeledSegments
+        Fragment generator. Must implement `bounds_from_file` and
+        `count_bounds`.
+    files : iterable
+        File generator yielding dictionaries.
+
+    Returns
+    -------
+    n_fragments : int
+        Same as `sum(len(list(generator.from_file(f))) for f in files)`.
+    """
+
+    n_fragments = 0
+    start, end = [], []
+    for current_file in files:
+        bounds = generator.bounds_from_file(current_file)
+        # fall back to actual generation when counting is not possible
+        if bounds is None:
+            n_fragments += len(generator.array_from_file(current_file))
+            continue
+        start.append(bounds[0])
+        end.append(bounds[1])
+
+    if start:
+        n_fragments += int(np.sum(generator.count_bounds(np.hstack(start),
+                                                         np.hstack(end))))
+    return n_fragments
+
+
+class CorpusLabelSampler(object):
+    """Label-balanced segment (and triplet) generator over a whole corpus
+
+    Unlike `RandomSegmentsPerLabel` and `RandomSegmentTriplets` which only
+    balance labels within one file, labels are balanced over the whole
+    corpus. Tracks of all files are indexed once into a flat table of
+    (file_id, start, end, label_id), sorted by label, so that drawing a
+    track with a given label is done in constant time.
+
+    Files are only preprocessed when one of their segments is drawn, and
+    the most recently used preprocessed files are kept in memory.
+
+    Parameters
+    ----------
+    files : iterable
+        File generator yielding dictionaries at least containing the 'uri'
+        and 'annotation' keys.
+    duration : float, optional
+        When provided, yield (random) subsegments with this `duration`.
+        Defaults to yielding full segments.
+    per_label : int, optional
+        Number of consecutive segments (or triplets) yielded with the same
+        label before switching to another label. Defaults to 40.
+    yield_label : bool, optional
+        When True, yield (segment, label) tuples. Defaults to segments.
+    preprocess : callable, optional
+        Called with a file as argument, returns the preprocessed file (e.g.
+        `MemmapFeatures.preprocess`). Defaults to yielding files as is.
+    max_open_files : int, optional
+        Number of preprocessed files kept in memory. Defaults to 32.
+    rng : np.random.Generator or int, optional
+        Random generator (or its seed). Defaults to numpy global random state.
+
+    Attributes
+    ----------
+    file_id : (n_tracks, ) np.ndarray
+    start, end : (n_tracks, ) np.ndarray
+    label : (n_tracks, ) np.ndarray
+        Track label codes (i.e. index in `vocabulary`).
+    vocabulary : list
+        Sorted list of labels of the whole corpus.
+    by_label : (n_tracks, ) np.ndarray
+        Tracks sorted by label.
+    label_offsets : (n_labels + 1, ) np.ndarray
+        Tracks of `l`th label are tracks
+        by_label[label_offsets[l]:label_offsets[l + 1]].
+
+    Usage
+    -----
+    >>> sampler = CorpusLabelSampler(protocol.train(), duration=2.,
+    ...                              preprocess=features.preprocess)
+    >>> for current_file, segment in sampler.iter_segments():
+    ...     do_something(current_file, segment)
+    """
+
+    def __init__(self, files, duration=0., per_label=40, yield_label=False,
+                 preprocess=None, max_open_files=32, rng=None):
+        super(CorpusLabelSampler, self).__init__()
+        self.rng = get_rng(rng)
+        self.files = list(files)
+        self.duration = duration
+        self.per_label = per_label
+        self.yield_label = yield_label
+        self.preprocess = preprocess
+        self.max_open_files = max_open_files
+        self.open_files_ = collections.OrderedDict()
+        self.lock_ = threading.Lock()
+
+        file_id, start, end, labels = [], [], [], []
+        for f, current_file in enumerate(self.files):
+            annotation = current_file['annotation']
+            for segment, _, label in annotation.itertracks(label=True):
+                if segment.duration < self.duration:
+                    continue
+                file_id.append(f)
+                start.append(segment.start)
+                end.append(segment.end)
+                labels.append(label)
+
+        self.vocabulary = sorted(set(labels), key=str)
+        mapping = {label: c for c, label in enumerate(self.vocabulary)}
+
+        self.file_id = np.array(file_id, dtype=np.int32)
+        self.start = np.array(start, dtype=np.float64)
+        self.end = np.array(end, dtype=np.float64)
+        self.label = np.array([mapping[label] for label in labels],
+                              dtype=np.int32)
+
+        self.by_label = np.argsort(self.label, kind='stable')
+        counts = np.bincount(self.label, minlength=len(self.vocabulary))
+        self.label_offsets = np.hstack([[0], np.cumsum(counts)])
+
+    def __len__(self):
+        return len(self.file_id)
+
+    def get_file(self, file_id):
+        """Get (lazily preprocessed) `file_id`th file"""
+
+        if self.preprocess is None:
+            return self.files[file_id]
+
+        with self.lock_:
+            if file_id in self.open_files_:
+                self.open_files_.move_to_end(file_id)
+                return self.open_files_[file_id]
+
+        current_file = self.preprocess(self.files[file_id])
+
+        with self.lock_:
+            self.open_files_[file_id] = current_file
+            while len(self.open_files_) > self.max_open_files:
+                self.open_files_.popitem(last=False)
+
+        return current_file
+
+    def draw_label(self, label):
+        """Draw one random track for each of `label`
+
+        Parameters
+        ----------
+        label : (size, ) np.ndarray
+            Label codes.
+
+        Returns
+        -------
+        tracks : (size, ) np.ndarray
+            Tracks indices.
+        """
+        label = np.asarray(label, dtype=np.int64)
+        first = self.label_offsets[label]
+        count = self.label_offsets[label + 1] - first
+        i = first + (self.rng.random(len(label)) * count).astype(np.int64)
+        return self.by_label[i]
+
+    def draw_other(self, label):
+        """Draw one random track not labeled `label` for each of `label`
+
+        Parameters
+        ----------
+        label : (size, ) np.ndarray
+            Label codes.
+
+        Returns
+        -------
+        tracks : (size, ) np.ndarray
+            Tracks indices.
+        """
+        if len(self.vocabulary) < 2:
+            raise ValueError('All tracks share the same label.')
+
+        label = np.asarray(label, dtype=np.int64)
+        tracks = self.rng.integers(len(self), size=len(label))
+        redraw = np.where(self.label[tracks] == label)[0]
+        while len(redraw):
+            tracks[redraw] = self.rng.integers(len(self), size=len(redraw))
+            redraw = redraw[self.label[tracks[redraw]] == label[redraw]]
+        return tracks
+
+    def draw_labels(self):
+        """Draw one epoch of labels
+
+        Returns
+        -------
+        label : (n_labels x per_label, ) np.ndarray
+            Label codes, in random order, each repeated `per_label` times.
+        """
+        labels = self.rng.permutation(len(self.vocabulary))
+        return np.repeat(labels, self.per_label)
+
+    def get_segments(self, tracks):
+        """Get (random subsegments of) tracks as a `SegmentArray`"""
+        start, end = self.start[tracks], self.end[tracks]
+        if self.duration:
+            from .fragment import random_subsegments
+            start, end, _ = random_subsegments(start, end, self.duration,
+                                               rng=self.rng)
+        return SegmentArray(start, end, label=self.label[tracks],
+                            vocabulary=self.vocabulary)
+
+    def _fragments(self, tracks, segments):
+        for file_id, fragment in zip(self.file_id[tracks].tolist(),
+                                     segments):
+            if not self.yield_label:
+                fragment = fragment[0]
+            yield self.get_file(file_id), fragment
+
+    def iter_segments(self):
+        """Yield (current_file, segment) tuples indefinitely
+
+        `segment` is a (segment, label) tuple when `yield_label` is True.
+        """
+        while len(self):
+            tracks = self.draw_label(self.draw_labels())
+            for item in self._fragments(tracks, self.get_segments(tracks)):
+                yield item
+
+    def iter_triplets(self):
+        """Yield (anchor, positive, negative) triplets indefinitely
+
+        Each of them is a (current_file, segment) tuple, where `segment`
+        is a (segment, label) tuple when `yield_label` is True.
+        """
+        if len(self.vocabulary) < 2:
+            return
+
+        while True:
+            label = self.draw_labels()
+            positives = self.draw_label(np.repeat(label, 2))
+            triplets = [positives[::2], positives[1::2],
+                        self.draw_other(label)]
+            fragments = [self._fragments(tracks, self.get_segments(tracks))
+                         for tracks in triplets]
+            for triplet in zip(*fragments):
+                yield triplet
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import os
+import json
+import time
+import atexit
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DurationIndex(object):
+    """Persistent index of audio durations
+
+    Fragment generators with source='audio' need the duration of each file,
+    which requires opening its audio header again and again at every epoch.
+    `DurationIndex` looks it up once and stores it in a JSON sidecar file,
+    keyed by file unique identifier, audio path and modification time (so
+    that modified or moved audio files are looked up again).
+
+    Parameters
+    ----------
+    path : str, optional
+        Path to the JSON sidecar file. It is loaded when it exists, and
+        written by `save`, by `populate`, every `save_every` new durations,
+        and when the interpreter exits. New durations are merged with those
+        saved in the meantime (e.g. by other processes) rather than
+        overwriting them. Defaults to in-memory index.
+    get_duration : callable, optional
+        Function returning the duration of a file (given as a dictionary).
+        Defaults to pyannote.audio `get_audio_duration`.
+    save_every : int, optional
+        Save index every that many new durations. Defaults to 100.
+    stat_every : float, optional
+        Check modification time of audio files at most once every that many
+        seconds. Defaults to 600s (i.e. about once per epoch).
+
+    Usage
+    -----
+    >>> durations = DurationIndex('durations.json')
+    >>> durations.populate(protocol.train(), n_jobs=8)
+    >>> generator = SlidingSegments(source='audio', durations=durations)
+    """
+
+    VERSION = 1
+
+    def __init__(self, path=None, get_duration=None, save_every=100,
+                 stat_every=600.):
+        super(DurationIndex, self).__init__()
+        self.path = path
+        if get_duration is None:
+            from pyannote.audio.features.utils import get_audio_duration
+            get_duration = get_audio_duration
+        self.get_duration = get_duration
+        self.save_every = save_every
+        self.stat_every = stat_every
+
+        # updated_ contains entries stored since last save
+        self.entries_ = {}
+        self.updated_ = {}
+        self.keys_ = {}
+        self.lock_ = threading.Lock()
+        self.save_lock_ = threading.Lock()
+
+        if path is not None:
+            if os.path.exists(path):
+                self.load()
+            # weak reference, not to keep the index alive until exit
+            atexit.register(_save_at_exit, weakref.ref(self))
+
+    def __getstate__(self):
+        # locks cannot be pickled (e.g. to be sent to worker processes)
+        state = dict(self.__dict__)
+        del state['lock_']
+        del state['save_lock_']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock_ = threading.Lock()
+        self.save_lock_ = threading.Lock()
+
+    def get_key(self, current_file):
+        """(uri, audio path, modification time) key of `current_file`
+
+        Modification time is only checked once every `stat_every` seconds.
+        """
+        from pyannote.database.util import get_unique_identifier
+        uri = get_unique_identifier(current_file)
+        audio = current_file.get('audio', None)
+        if audio is None:
+            return uri, None, None
+        audio = str(audio)
+
+        now = time.monotonic()
+        key, checked = self.keys_.get(uri, (None, None))
+        if key is not None and key[1] == audio and \
+           now - checked < self.stat_every:
+            return key
+
+        try:
+            mtime = os.stat(audio).st_mtime
+        except OSError:
+            mtime = None
+        key = (uri, audio, mtime)
+        self.keys_[uri] = (key, now)
+        return key
+
+    def lookup(self, key):
+        """Duration stored for `key`, None if missing or outdated"""
+        uri, audio, mtime = key
+        entry = self.entries_.get(uri, None)
+        if entry is None or entry[:2] != [audio, mtime]:
+            return None
+        return entry[2]
+
+    def store(self, key, duration):
+        uri, audio, mtime = key
+        entry = [audio, mtime, float(duration)]
+        with self.lock_:
+            self.entries_[uri] = entry
+            self.updated_[uri] = entry
+
+    def __call__(self, current_file):
+        """Get duration of `current_file` (looking it up in case of miss)"""
+        key = self.get_key(current_file)
+        duration = self.lookup(key)
+        if duration is None:
+            duration = self.get_duration(current_file)
+            self.store(key, duration)
+            if len(self.updated_) >= self.save_every:
+                self.save()
+        return duration
+
+    def populate(self, files, n_jobs=1, save=True):
+        """Look up durations of all files at once
+
+        Parameters
+        ----------
+        files : iterable
+            File generator (typically the 'train' method of a protocol).
+        n_jobs : int, optional
+            Number of threads used to read audio headers. Defaults to 1.
+        save : bool, optional
+            Write index to `path` when done (when provided). Defaults to True.
+        """
+
+        missing = []
+        for current_file in files:
+            key = self.get_key(current_file)
+            if self.lookup(key) is None:
+                missing.append((key, current_file))
+
+        if n_jobs > 1:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                durations = list(executor.map(
+                    self.get_duration, [f for _, f in missing]))
+        else:
+            durations = [self.get_duration(f) for _, f in missing]
+
+        for (key, _), duration in zip(missing, durations):
+            self.store(key, duration)
+
+        if save and self.path is not None:
+            self.save()
+
+    def read(self):
+        """Entries currently stored in `path` (empty if none)"""
+        try:
+            with open(self.path, 'r') as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+        if data.get('version', None) != self.VERSION:
+            return {}
+        return data['durations']
+
+    def load(self):
+        entries = self.read()
+        with self.lock_:
+            self.entries_ = entries
+            self.updated_ = {}
+
+    def save(self):
+        """Merge new entries into `path` (only when there are some)"""
+        if self.path is None or not self.updated_:
+            return
+        with self.save_lock_:
+            with self.lock_:
+                updated, self.updated_ = self.updated_, {}
+            if not updated:
+                return
+            try:
+                # entries saved in the meantime (e.g. by other processes)
+                entries = self.read()
+                entries.update(updated)
+                # write to a temporary file first so that a crash (or
+                # concurrent readers) never sees a partially written index
+                tmp = '{path}.{pid}.tmp'.format(path=self.path,
+                                                pid=os.getpid())
+                with open(tmp, 'w') as fp:
+                    json.dump({'version': self.VERSION,
+                               'durations': entries}, fp)
+                os.replace(tmp, self.path)
+            except Exception:
+                with self.lock_:
+                    updated.update(self.updated_)
+                    self.updated_ = updated
+                raise
+            with self.lock_:
+                entries.update(self.updated_)
+                self.entries_ = entries
+
+    def __len__(self):
+        return len(self.entries_)
+
+
+def _save_at_exit(reference):
+    durations = reference()
+    if durations is not None:
+        durations.save()
+
+
+def get_audio_duration(current_file, durations=None):
+    """Get audio duration of `current_file`
+
+    Parameters
+    ----------
+    current_file : dict
+    durations : DurationIndex, optional
+        When provided, get duration from this index.
+    """
+    if durations is not None:
+        return durations(current_file)
+    from pyannote.audio.features.utils import get_audio_duration
+    return get_audio_duration(current_file)
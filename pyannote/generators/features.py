@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+import os.path
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+def strided_windows(data, n_frames, step=1):
+    """Strided view of fixed-length windows over `data` (no copy)
+
+    Parameters
+    ----------
+    data : (n_samples, ...) np.ndarray
+    n_frames : int
+        Number of frames per window.
+    step : int, optional
+        Number of frames between consecutive windows. Defaults to 1.
+
+    Returns
+    -------
+    windows : (n_windows, n_frames, ...) np.ndarray
+        Read-only view where windows[k] is data[k * step:k * step + n_frames]
+    """
+    n_windows = max(0, (len(data) - n_frames) // step + 1)
+    shape = (n_windows, n_frames) + data.shape[1:]
+    strides = (step * data.strides[0], ) + data.strides
+    return as_strided(data, shape=shape, strides=strides, writeable=False)
+
+
+class MemmapFeatures(object):
+    """Fixed-duration feature crops from memory-mapped feature files
+
+    Provides a (preprocess, process, pack) triplet for `FileBasedBatchGenerator`
+    that never loads whole feature files into memory: features are opened as
+    `np.memmap` and only frames actually used in a batch are read from disk.
+
+    Parameters
+    ----------
+    root_dir : str
+        Features of file with uri "{uri}" are expected to be stored (with
+        `np.save`) as (n_frames, dimension) arrays in "{root_dir}/{uri}.npy".
+    frames : SlidingWindow
+        Feature sliding window.
+    duration : float
+        Duration of feature crops, in seconds.
+    key : str, optional
+        Key under which memory-mapped features are stored in `current_file`
+        by `preprocess`. Defaults to 'features'.
+    dimension : int, optional
+        Feature dimension, only used to pack empty batches. Defaults to the
+        dimension of the last preprocessed file.
+
+    Usage
+    -----
+    >>> features = MemmapFeatures(root_dir, frames, duration=3.2)
+    >>> class Batches(FileBasedBatchGenerator):
+    ...     def preprocess(self, current_file, **kwargs):
+    ...         return features.preprocess(current_file)
+    >>> signature = {'@': (features.process, features.pack)}
+    >>> batches = Batches(SlidingSegments(duration=3.2), signature)
+    """
+
+    def __init__(self, root_dir, frames, duration, key='features',
+                 dimension=None):
+        super(MemmapFeatures, self).__init__()
+        self.root_dir = root_dir
+        self.frames = frames
+        self.duration = duration
+        self.key = key
+        self.dimension = dimension
+        self.n_frames = frames.samples(duration, mode='center')
+        self.dtype_ = np.float32
+
+    def get_path(self, current_file):
+        return os.path.join(self.root_dir, current_file['uri'] + '.npy')
+
+    def preprocess(self, current_file):
+        """Add memory-mapped features to (a copy of) `current_file`"""
+        current_file = dict(current_file)
+        features = np.load(self.get_path(current_file), mmap_mode='r')
+        self.check_length(features, uri=current_file['uri'])
+        current_file[self.key] = features
+        if features.ndim > 1:
+            self.dimension = features.shape[1]
+        self.dtype_ = features.dtype
+        return current_file
+
+    def check_length(self, features, uri=None):
+        """Raise ValueError if `features` are shorter than one crop"""
+        if len(features) < self.n_frames:
+            msg = ('{uri} has {n} feature frames but crops need {n_frames} '
+                   'frames ({duration:g}s).')
+            uri = 'File' if uri is None else 'File "{uri}"'.format(uri=uri)
+            raise ValueError(msg.format(uri=uri, n=len(features),
+                                        n_frames=self.n_frames,
+                                        duration=self.duration))
+
+    def get_start_frame(self, segment, features):
+        """Index of first frame of `segment` crop
+
+        Crops are shifted when needed so that they do not extend past the
+        boundaries of the feature file. Raises ValueError when the feature
+        file is shorter than one crop.
+        """
+        self.check_length(features)
+        start_frame = self.frames.closest_frame(segment.start)
+        return min(max(start_frame, 0), len(features) - self.n_frames)
+
+    def crop(self, segment, current_file):
+        """Get `segment` crop as a view on memory-mapped features (no copy)
+
+        Parameters
+        ----------
+        segment : Segment
+        current_file : dict
+            Preprocessed file.
+
+        Returns
+        -------
+        crop : (n_frames, dimension) np.memmap
+        """
+        features = current_file[self.key]
+        start_frame = self.get_start_frame(segment, features)
+        return features[start_frame:start_frame + self.n_frames]
+
+    def process(self, item, current_file=None):
+        """`process_func` for batch generators signature
+
+        Parameters
+        ----------
+        item : Segment or (Segment, ...) tuple
+        current_file : dict
+            Preprocessed file.
+
+        Returns
+        -------
+        features : np.memmap
+            Memory-mapped features.
+        start_frame : int
+            Index of first frame of crop.
+        """
+        from pyannote.core import Segment
+        segment = item if isinstance(item, Segment) else item[0]
+        features = current_file[self.key]
+        return features, self.get_start_frame(segment, features)
+
+    def pack(self, batch):
+        """`pack_func` for batch generators signature
+
+        Crops are gathered into the packed array with one fancy-index copy
+        per feature file.
+
+        Parameters
+        ----------
+        batch : list
+            List of (features, start_frame) tuples returned by `process`.
+
+        Returns
+        -------
+        packed : (batch_size, n_frames, dimension) np.ndarray
+        """
+
+        if not batch:
+            shape = (0, self.n_frames)
+            if self.dimension is not None:
+                shape += (self.dimension, )
+            return np.empty(shape, dtype=self.dtype_)
+
+        features = [f for f, _ in batch]
+        start_frame = np.array([s for _, s in batch], dtype=np.int64)
+        shape = (len(batch), self.n_frames) + features[0].shape[1:]
+        packed = np.empty(shape, dtype=features[0].dtype)
+
+        window = np.arange(self.n_frames)
+        keys = np.array([id(f) for f in features])
+        for key in np.unique(keys):
+            rows = np.where(keys == key)[0]
+            indices = start_frame[rows, np.newaxis] + window
+            packed[rows] = features[rows[0]][indices]
+
+        return packed
+
+    def iter_chunks(self, segments, current_file, max_windows=None):
+        """Read overlapping windows one contiguous chunk at a time
+
+        Consecutive overlapping windows (e.g. from `SlidingSegments` with a
+        step smaller than their duration) are grouped into chunks. Each chunk
+        is read only once from disk, and windows are obtained as a strided
+        view over it, so that I/O is proportional to the duration of the file
+        rather than the cumulated duration of all windows.
+
+        Parameters
+        ----------
+        segments : SegmentArray
+            Windows, in chronological order.
+        current_file : dict
+            Preprocessed file.
+        max_windows : int, optional
+            Maximum number of windows per chunk. Defaults to no limit.
+
+        Yields
+        ------
+        windows : SegmentArray
+            Windows of current chunk.
+        crops : (n_windows, n_frames, dimension) np.ndarray
+            Features of each window. This is a view over the chunk whenever
+            windows are regularly spaced on the feature frame grid (and a
+            copy of the windows otherwise).
+        """
+
+        if not len(segments):
+            return
+
+        features = current_file[self.key]
+        self.check_length(features)
+        n = self.n_frames
+
+        start_frame, _ = segments.to_frames(self.frames, fixed=self.duration)
+        start_frame = np.clip(start_frame, 0, len(features) - n)
+
+        # start a new chunk whenever consecutive windows do not overlap...
+        delta = np.diff(start_frame)
+        new = np.ones(len(start_frame), dtype=bool)
+        new[1:] = (delta < 0) | (delta >= n)
+        # ... or when chunk already contains `max_windows` windows
+        if max_windows is not None:
+            run = np.cumsum(new) - 1
+            position = np.arange(len(new)) - np.where(new)[0][run]
+            new |= position % max_windows == 0
+
+        boundaries = np.hstack([np.where(new)[0], [len(new)]])
+        for a, b in zip(boundaries[:-1], boundaries[1:]):
+
+            # read chunk at once
+            first = start_frame[a]
+            chunk = np.array(features[first:start_frame[b - 1] + n])
+
+            offset = start_frame[a:b] - first
+            step = np.diff(offset)
+            if b - a == 1:
+                crops = strided_windows(chunk, n)
+            elif step[0] > 0 and np.all(step == step[0]):
+                crops = strided_windows(chunk, n, step=step[0])
+            else:
+                crops = strided_windows(chunk, n)[offset]
+
+            yield segments[a:b], crops
@@ -30,28 +30,56 @@
 import warnings
 import numpy as np
 
+# unlike other modules, this one imports pyannote.core eagerly: fragment
+# generators consume and produce pyannote.core objects everywhere
 from pyannote.core import Segment
 from pyannote.core import Timeline
 from pyannote.core import Annotation
-from pyannote.core import SlidingWindow
-from pyannote.database.util import get_annotated
+from pyannote.core.segment import SEGMENT_PRECISION
+from .segment import SegmentArray
+from .segment import encode_labels
+from .segment import TrackIndex
+from .alias import AliasTable
+from .cache import cached_plan
+from .duration import get_audio_duration
+from .rng import get_rng
+from .rng import file_rng
+from .rng import check_rng
 
 
-def random_segment(segments, weighted=False):
-    """Generate segment with probability proportional to its duration"""
+def random_segment(segments, weighted=False, batch_size=1024, rng=None):
+    """Generate segment with probability proportional to its duration
 
-    p = None
-    if weighted:
-        total = float(sum(s.duration for s in segments))
-        p = [s.duration / total for s in segments]
+    Parameters
+    ----------
+    segments : list of Segment
+    weighted : bool, optional
+        When True, probability of generating a segment is proportional to its
+        duration. Defaults to uniform probability.
+    batch_size : int, optional
+        Number of random segments drawn at once. Defaults to 1024.
+    rng : np.random.Generator, optional
+        Random generator. Defaults to numpy global random state.
+    """
 
     n_segments = len(segments)
+    rng = get_rng(rng)
+
+    if weighted:
+        table = AliasTable([s.duration for s in segments])
+
+        def draw(size):
+            return table.draw(size=size, rng=rng)
+    else:
+        def draw(size):
+            return rng.integers(n_segments, size=size)
+
     while True:
-        i = np.random.choice(n_segments, p=p)
-        yield segments[i]
+        for i in draw(batch_size):
+            yield segments[i]
 
 
-def random_subsegment(segment, duration, min_duration=None):
+def random_subsegment(segment, duration, min_duration=None, rng=None):
     """Pick a subsegment at random
 
     Parameters
@@ -62,6 +90,8 @@ def random_subsegment(segment, duration, min_duration=None):
     min_duration : float, optional
         When provided, choose segment duration at random between `min_duration`
         and `duration` (instead of fixed `duration`).
+    rng : np.random.Generator, optional
+        Random generator. Defaults to numpy global random state.
 
     Usage
     -----
@@ -72,6 +102,8 @@ def random_subsegment(segment, duration, min_duration=None):
     >>> generator = random_subsegment(segment, duration)
     >>> subsegment = next(generator)
     """
+    rng = get_rng(rng)
+
     if min_duration is None:
 
         if duration > segment.duration:
@@ -82,7 +114,7 @@ def random_subsegment(segment, duration, min_duration=None):
         while True:
             # draw start time from [segment.start, segment.end - duration]
             t = segment.start + \
-                np.random.random() * (segment.duration - duration)
+                rng.random() * (segment.duration - duration)
             yield Segment(t, t + duration)
 
     else:
@@ -92,17 +124,366 @@ def random_subsegment(segment, duration, min_duration=None):
         while True:
             # draw duration from [min_duration, max_duration] interval
             rnd_duration = min_duration + \
-                           np.random.random() * (max_duration - min_duration)
+                           rng.random() * (max_duration - min_duration)
 
             # draw start from [segment.start, segment.end - rnd_duration] interval
-            t = segment.start + np.random.random() * (segment.duration - rnd_duration)
+            t = segment.start + rng.random() * (segment.duration - rnd_duration)
             yield Segment(t, t + rnd_duration)
 
 
+def random_subsegments(start, end, duration, min_duration=None, size=1,
+                       rng=None):
+    """Pick many subsegments at random at once
+
+    This is the vectorized equivalent of calling `random_subsegment` on a
+    whole set of segments.
+
+    Parameters
+    ----------
+    start, end : float or (n_segments, ) array-like
+        Segments start and end times.
+    duration : float
+        Duration of random subsegments
+    min_duration : float, optional
+        When provided, choose subsegments duration at random between
+        `min_duration` and `duration` (instead of fixed `duration`).
+    size : int or (n_segments, ) array-like, optional
+        Number of random subsegments per segment. Defaults to 1.
+    rng : np.random.Generator, optional
+        Random generator. Defaults to numpy global random state.
+
+    Returns
+    -------
+    sub_start, sub_end : (n_subsegments, ) np.ndarray
+        Random subsegments start and end times, in segment order.
+    index : (n_subsegments, ) np.ndarray
+        Index of the segment each subsegment originates from.
+    """
+
+    rng = get_rng(rng)
+    start = np.atleast_1d(np.asarray(start, dtype=np.float64))
+    end = np.atleast_1d(np.asarray(end, dtype=np.float64))
+    size = np.broadcast_to(np.asarray(size, dtype=np.int64), start.shape)
+
+    index = np.repeat(np.arange(len(start)), size)
+    start, end = start[index], end[index]
+    length = end - start
+
+    if min_duration is None:
+
+        too_short = duration > length
+        if np.any(too_short):
+            segment_duration = length[too_short][0]
+            msg = (f'`duration` (= {duration:g}) should be smaller '
+                   f'than `segment` duration (= {segment_duration:g}).')
+            raise ValueError(msg)
+
+        # draw start time from [segment.start, segment.end - duration]
+        t = start + rng.random(len(index)) * (length - duration)
+        return t, t + duration, index
+
+    # make sure max duration is smaller than actual segment duration
+    max_duration = np.minimum(length, duration)
+
+    # draw duration from [min_duration, max_duration] interval
+    rnd_duration = min_duration + \
+        rng.random(len(index)) * (max_duration - min_duration)
+
+    # draw start from [segment.start, segment.end - rnd_duration] interval
+    t = start + rng.random(len(index)) * (length - rnd_duration)
+    return t, t + rnd_duration, index
+
+
 def remove_short_segment(timeline, shorter_than):
     return Timeline([s for s in timeline if s.duration > shorter_than])
 
 
+def sliding_windows(start, end, duration, step, min_duration=None,
+                    crop=False):
+    """Slide a window over many segments at once
+
+    This is the vectorized equivalent of sliding a `SlidingWindow` over each
+    segment and only keeping positions fully contained by the segment.
+
+    Parameters
+    ----------
+    start, end : (n_segments, ) np.ndarray
+        Segments start and end times.
+    duration, step : float
+        Duration and step of sliding window (in seconds).
+    min_duration : float, optional
+        When provided, segments shorter than `duration` (but longer than
+        `min_duration`) are kept as they are, and one final window is added
+        at the end of longer segments when the last fully contained position
+        does not reach the end of the segment.
+    crop : bool, optional
+        Defaults to shifting the final window so that it ends exactly at the
+        end of the segment. Set to True to use the intersection of the next
+        window position with the segment instead (and only keep it when it
+        is longer than `min_duration`).
+
+    Returns
+    -------
+    window_start, window_end : (n_windows, ) np.ndarray
+        Windows start and end times, in segment order.
+    index : (n_windows, ) np.ndarray
+        Index of the segment each window originates from.
+    """
+
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+    n_segments = len(start)
+
+    variable_length = min_duration is not None
+    if not variable_length:
+        min_duration = duration
+
+    n, long_enough, slide = window_positions(start, end, duration, step,
+                                             min_duration)
+
+    index = np.repeat(np.arange(n_segments), n)
+    offset = np.arange(len(index)) - np.repeat(np.cumsum(n) - n, n)
+    window_start = start[index] + offset * step
+    window_end = window_start + duration
+
+    if not variable_length:
+        return window_start, window_end, index
+
+    # segments shorter than duration are kept as they are
+    whole = np.where(long_enough & ~slide)[0]
+
+    # final window of segments not fully covered by sliding positions
+    last = start + n * step
+    tail = np.where(slide & (last < end))[0]
+    if crop:
+        tail = tail[end[tail] - last[tail] >= min_duration]
+        tail_start, tail_end = last[tail], end[tail]
+    else:
+        tail_start, tail_end = end[tail] - duration, end[tail]
+
+    index = np.hstack([whole, index, tail])
+    order = np.argsort(index, kind='stable')
+    window_start = np.hstack([start[whole], window_start, tail_start])[order]
+    window_end = np.hstack([end[whole], window_end, tail_end])[order]
+    return window_start, window_end, index[order]
+
+
+def window_positions(start, end, duration, step, min_duration):
+    """Number of window positions fully contained by each segment
+
+    Returns
+    -------
+    n : (n_segments, ) np.ndarray
+        Number of window positions fully contained by each segment.
+    long_enough : (n_segments, ) np.ndarray
+        Whether segments are longer than `min_duration`.
+    slide : (n_segments, ) np.ndarray
+        Whether segments are long enough to slide a window over them.
+    """
+
+    length = end - start
+    long_enough = length >= min_duration
+    slide = long_enough & (length >= duration)
+
+    n = np.zeros(len(start), dtype=np.int64)
+    n[slide] = np.floor((length[slide] - duration) / step).astype(np.int64) + 1
+    n = np.maximum(n, 0)
+    # fix rounding errors by checking positions the way SlidingWindow does
+    for _ in range(2):
+        too_many = (n > 0) & (start + (n - 1) * step + duration > end)
+        n[too_many] -= 1
+        too_few = slide & (start + n * step + duration <= end)
+        n[too_few] += 1
+
+    return n, long_enough, slide
+
+
+def count_windows(start, end, duration, step, min_duration=None,
+                  crop=False):
+    """Count windows of `sliding_windows` without generating them
+
+    Parameters
+    ----------
+    start, end : (n_segments, ) np.ndarray
+        Segments start and end times.
+    duration, step, min_duration, crop :
+        See `sliding_windows`.
+
+    Returns
+    -------
+    n_windows : (n_segments, ) np.ndarray
+        Number of windows generated by `sliding_windows` for each segment.
+    """
+
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+
+    variable_length = min_duration is not None
+    if not variable_length:
+        min_duration = duration
+
+    n, long_enough, slide = window_positions(start, end, duration, step,
+                                             min_duration)
+    if not variable_length:
+        return n
+
+    # segments shorter than duration are kept as they are
+    whole = long_enough & ~slide
+
+    # final window of segments not fully covered by sliding positions
+    last = start + n * step
+    tail = slide & (last < end)
+    if crop:
+        tail &= end - last >= min_duration
+
+    return n + whole + tail
+
+
+def gaps(start, end, support):
+    """Gaps of a set of segments within a support
+
+    This is the array equivalent of `Timeline.gaps`.
+
+    Parameters
+    ----------
+    start, end : (n_segments, ) np.ndarray
+        Segments start and end times.
+    support : Segment or Timeline
+
+    Returns
+    -------
+    gap_start, gap_end : (n_gaps, ) np.ndarray
+        Gaps start and end times, in chronological order.
+    """
+
+    # merge overlapping (or contiguous) segments
+    order = np.lexsort((end, start))
+    start = np.asarray(start, dtype=np.float64)[order]
+    end = np.asarray(end, dtype=np.float64)[order]
+    if len(start):
+        previous_end = np.maximum.accumulate(end)[:-1]
+        new = np.ones(len(start), dtype=bool)
+        new[1:] = start[1:] - previous_end > SEGMENT_PRECISION
+        end = np.maximum.reduceat(end, np.where(new)[0])
+        start = start[new]
+
+    if isinstance(support, Segment):
+        support = [support]
+    else:
+        support = support.support()
+
+    gap_start, gap_end = [], []
+    for segment in support:
+        # merged segments intersecting current support segment
+        i = np.searchsorted(end, segment.start, side='right')
+        j = np.searchsorted(start, segment.end, side='left')
+        starts = np.hstack([[segment.start],
+                            np.minimum(end[i:j], segment.end)])
+        ends = np.hstack([np.maximum(start[i:j], segment.start),
+                          [segment.end]])
+        nonempty = ends - starts > SEGMENT_PRECISION
+        gap_start.append(starts[nonempty])
+        gap_end.append(ends[nonempty])
+
+    if not gap_start:
+        return np.empty((0, )), np.empty((0, ))
+    return np.hstack(gap_start), np.hstack(gap_end)
+
+
+def majority_labels(window_start, window_end, start, end, codes):
+    """Majority label of many windows at once
+
+    This is the vectorized equivalent of calling `Annotation.argmax` for
+    every window, where labeled tracks are described by (`start`, `end`,
+    `codes`) arrays. Per-label coverage of all windows is obtained in one
+    pass over the list of (track, window) intersections.
+
+    Parameters
+    ----------
+    window_start, window_end : (n_windows, ) np.ndarray
+        Windows start and end times. Windows must share the same duration
+        but may come in any order (e.g. when sliding over overlapping
+        segments).
+    start, end : (n_tracks, ) np.ndarray
+        Tracks start and end times. Tracks with the same label must not
+        overlap (e.g. use `Annotation.support`).
+    codes : (n_tracks, ) np.ndarray
+        Tracks label codes. In case of a tie, the smallest code wins.
+
+    Returns
+    -------
+    majority : (n_windows, ) np.ndarray
+        Majority label code of each window (-1 when no track intersects it).
+    """
+
+    window_start = np.asarray(window_start, dtype=np.float64)
+    window_end = np.asarray(window_end, dtype=np.float64)
+    n_windows = len(window_start)
+
+    # windows must be in chronological order for the searchsorted join
+    # below: sort them (and put majority labels back in original order)
+    if np.any(np.diff(window_start) < 0):
+        window_order = np.argsort(window_start, kind='stable')
+        majority = majority_labels(window_start[window_order],
+                                   window_end[window_order],
+                                   start, end, codes)
+        unsorted = np.empty(n_windows, dtype=np.int64)
+        unsorted[window_order] = majority
+        return unsorted
+
+    majority = np.full(n_windows, -1, dtype=np.int64)
+
+    # process tracks in chronological order
+    order = np.argsort(start, kind='stable')
+    start = np.asarray(start, dtype=np.float64)[order]
+    end = np.asarray(end, dtype=np.float64)[order]
+    codes = np.asarray(codes, dtype=np.int64)[order]
+
+    # range of windows possibly intersecting each track
+    first = np.searchsorted(window_end, start, side='left')
+    last = np.searchsorted(window_start, end, side='right')
+    n = np.maximum(last - first, 0)
+
+    track = np.repeat(np.arange(len(start)), n)
+    window = np.arange(len(track)) - np.repeat(np.cumsum(n) - n, n) \
+        + np.repeat(first, n)
+
+    t_start, t_end = start[track], end[track]
+    w_start, w_end = window_start[window], window_end[window]
+
+    # same intersection test as Segment.intersects
+    intersects = (t_end - t_start > SEGMENT_PRECISION) & (
+        (t_start == w_start) |
+        ((t_start < w_start) & (w_start < t_end - SEGMENT_PRECISION)) |
+        ((t_start > w_start) & (t_start < w_end - SEGMENT_PRECISION)))
+    overlap = np.minimum(t_end, w_end) - np.maximum(t_start, w_start)
+    keep = intersects & (overlap > SEGMENT_PRECISION)
+    track, window, overlap = track[keep], window[keep], overlap[keep]
+    if not len(track):
+        return majority
+
+    # per-(window, label) coverage, summed in chronological order
+    label = codes[track]
+    order = np.lexsort((track, label, window))
+    track, window, label, overlap = \
+        track[order], window[order], label[order], overlap[order]
+    new_group = np.ones(len(track), dtype=bool)
+    new_group[1:] = (window[1:] != window[:-1]) | (label[1:] != label[:-1])
+    group = np.cumsum(new_group) - 1
+    coverage = np.zeros(group[-1] + 1, dtype=np.float64)
+    np.add.at(coverage, group, overlap)
+    window, label = window[new_group], label[new_group]
+
+    # longest coverage first, smallest label code first in case of a tie
+    order = np.lexsort((label, -coverage, window))
+    window, label = window[order], label[order]
+    first = np.ones(len(window), dtype=bool)
+    first[1:] = window[1:] != window[:-1]
+    majority[window[first]] = label[first]
+
+    return majority
+
+
 class SlidingSegments(object):
     """Sliding segment generator
 
@@ -118,10 +499,22 @@ class SlidingSegments(object):
         than `min_duration`).
     source: {'annotated', 'annotated_extent', 'support', 'annotation', 'audio'}, optional.
         Defaults to 'annotation'
+    frames : SlidingWindow, optional
+        Feature sliding window. When provided, `frames_from_file` can be used
+        to get the range of frames covered by each segment.
+    snap : bool, optional
+        Set to True to snap windows to the `frames` grid, so that every window
+        spans exactly the same number of frames. Defaults to False.
+    cache : PlanCache, optional
+        When provided, cache per-file plans across epochs.
+    durations : DurationIndex, optional
+        When provided (and source is 'audio'), get file durations from this
+        index instead of reading audio headers at every epoch.
     """
 
     def __init__(self, duration=3.2, step=None,
-                 min_duration=None, source='annotation'):
+                 min_duration=None, source='annotation',
+                 frames=None, snap=False, cache=None, durations=None):
         super(SlidingSegments, self).__init__()
 
         self.duration = duration
@@ -138,29 +531,65 @@ class SlidingSegments(object):
 
         self.source = source
 
+        self.frames = frames
+        self.snap = snap
+        self.cache = cache
+        self.durations = durations
+
     def from_file(self, current_file):
+        for segment in self.array_from_file(current_file):
+            yield segment
+
+    def array_from_file(self, current_file):
+        """Same as `from_file` but returns all segments as a `SegmentArray`"""
+        return cached_plan(self, current_file,
+                           lambda: self.plan_from_file(current_file))
+
+    def plan_from_file(self, current_file):
+        """Same as `array_from_file`, bypassing plan cache"""
+        segments = self.array_segments(self.get_source(current_file))
+        if self.snap:
+            segments = segments.snap(self.frames)
+        return segments
+
+    def frames_from_file(self, current_file):
+        """Same as `array_from_file` but also returns frame ranges
+
+        Returns
+        -------
+        segments : SegmentArray
+        start_frame, n_frames : (n_segments, ) np.ndarray
+            Range of `frames` covered by each segment.
+        """
+        if self.frames is None:
+            raise ValueError('"frames" sliding window must be provided.')
+        segments = self.array_from_file(current_file)
+        fixed = None if self.variable_length_ else self.duration
+        start_frame, n_frames = segments.to_frames(self.frames, fixed=fixed)
+        return segments, start_frame, n_frames
+
+    def get_source(self, current_file):
 
         if isinstance(self.source, (Segment, Timeline)):
-            source = self.source
+            return self.source
 
         elif self.source == 'annotated':
-            source = get_annotated(current_file)
+            from pyannote.database.util import get_annotated
+            return get_annotated(current_file)
 
         elif self.source == 'annotated_extent':
-            source = get_annotated(current_file).extent()
+            from pyannote.database.util import get_annotated
+            return get_annotated(current_file).extent()
 
         elif self.source == 'annotation':
-            source = current_file['annotation']
+            return current_file['annotation']
 
         elif self.source == 'support':
-            source = current_file['annotation'].get_timeline().support()
+            return current_file['annotation'].get_timeline().support()
 
         elif self.source == 'audio':
-            from pyannote.audio.features.utils import get_audio_duration
-            source = get_audio_duration(current_file)
-
-        for segment in self.iter_segments(source):
-            yield segment
+            return get_audio_duration(current_file,
+                                      durations=self.durations)
 
     def iter_segments(self, source):
         """
@@ -172,6 +601,40 @@ class SlidingSegments(object):
             If `Timeline`, yield running segments within this timeline.
             If `Annotation`, yield running segments within its timeline.
         """
+        for segment in self.array_segments(source):
+            yield segment
+
+    def array_segments(self, source):
+        """Same as `iter_segments` but returns all segments as a `SegmentArray`
+
+        Parameters
+        ----------
+        source : float, Segment, Timeline or Annotation
+            See `iter_segments`.
+
+        Returns
+        -------
+        segments : SegmentArray
+        """
+
+        start, end = self.get_bounds(source)
+        min_duration = self.min_duration if self.variable_length_ else None
+        start, end, _ = sliding_windows(start, end, self.duration, self.step,
+                                        min_duration=min_duration)
+        return SegmentArray(start, end)
+
+    def get_bounds(self, source):
+        """Get start and end times of segments the window slides over
+
+        Parameters
+        ----------
+        source : float, Segment, Timeline or Annotation
+            See `iter_segments`.
+
+        Returns
+        -------
+        start, end : (n_segments, ) np.ndarray
+        """
 
         if isinstance(source, Annotation):
             segments = source.get_timeline()
@@ -191,48 +654,54 @@ class SlidingSegments(object):
             raise TypeError(
                 'source must be float, Segment, Timeline or Annotation')
 
-        for segment in segments:
+        start = np.array([segment.start for segment in segments],
+                         dtype=np.float64)
+        end = np.array([segment.end for segment in segments],
+                       dtype=np.float64)
+        return start, end
 
-            # skip segments that are too short
-            if segment.duration < self.min_duration:
-                continue
+    def count_bounds(self, start, end):
+        """Number of segments yielded for each of the provided bounds
 
-            # yield segments shorter than duration
-            # when variable length segments are allowed
-            elif segment.duration < self.duration:
-                if self.variable_length_:
-                    yield segment
+        Parameters
+        ----------
+        start, end : (n_segments, ) np.ndarray
+            As returned by `get_bounds`.
 
-            # yield sliding segments within current track
-            else:
-                window = SlidingWindow(
-                    duration=self.duration, step=self.step,
-                    start=segment.start, end=segment.end)
+        Returns
+        -------
+        n_segments : (n_segments, ) np.ndarray
+        """
+        min_duration = self.min_duration if self.variable_length_ else None
+        return count_windows(start, end, self.duration, self.step,
+                             min_duration=min_duration)
 
-                for s in window:
+    def count_segments(self, source):
+        """Same as `len(list(iter_segments(source)))`, without iterating"""
+        return int(np.sum(self.count_bounds(*self.get_bounds(source))))
 
-                    # if current window is fully contained by segment
-                    if s in segment:
-                        yield s
+    def bounds_from_file(self, current_file):
+        """Same as `get_bounds` for file source"""
+        return self.get_bounds(self.get_source(current_file))
 
-                    # if it is not but variable length segments are allowed
-                    elif self.variable_length_:
-                        yield Segment(start=segment.end - self.duration,
-                                      end=segment.end)
-                        break
+    def count_from_file(self, current_file):
+        """Same as `len(list(from_file(current_file)))`, without iterating"""
+        return int(np.sum(self.count_bounds(
+            *self.bounds_from_file(current_file))))
 
 
 class TwinSlidingSegments(SlidingSegments):
 
-    def __init__(self, duration=3.2, step=0.8, gap=0.0):
+    def __init__(self, duration=3.2, step=0.8, gap=0.0, durations=None):
         super(TwinSlidingSegments, self).__init__(
-            duration=duration, step=step, source='audio')
+            duration=duration, step=step, source='audio',
+            durations=durations)
         self.gap = gap
 
     def from_file(self, current_file):
-        from pyannote.audio.features.utils import get_audio_duration
 
-        duration = get_audio_duration(current_file)
+        duration = get_audio_duration(current_file,
+                                      durations=self.durations)
 
         for left in self.iter_segments(duration):
             right = Segment(left.end + self.gap,
@@ -264,12 +733,24 @@ class SlidingLabeledSegments(object):
         but shortest segments are also permitted (as long as they are longer
         than `min_duration`). This parameter has no effect when "heterogeneous"
         is set to True.
+    frames : SlidingWindow, optional
+        Feature sliding window. When provided, `frames_from_file` can be used
+        to get the range of frames covered by each segment.
+    snap : bool, optional
+        Set to True to snap windows to the `frames` grid, so that every window
+        spans exactly the same number of frames. Defaults to False.
+    cache : PlanCache, optional
+        When provided, cache per-file plans across epochs.
+    durations : DurationIndex, optional
+        When provided (and source is 'audio'), get file durations from this
+        index instead of reading audio headers at every epoch.
 
     """
 
     def __init__(self, duration=3.2, step=None,
                  heterogeneous=False, skip_unlabeled=False,
-                 source='annotation', min_duration=None):
+                 source='annotation', min_duration=None,
+                 frames=None, snap=False, cache=None, durations=None):
         super(SlidingLabeledSegments, self).__init__()
 
         self.duration = duration
@@ -297,11 +778,62 @@ class SlidingLabeledSegments(object):
         else:
             self.min_duration = duration
 
+        self.frames = frames
+        self.snap = snap
+        self.cache = cache
+        self.durations = durations
+
     def from_file(self, current_file):
+        for segment, label in self.array_from_file(current_file):
+            yield segment, label
+
+    def frames_from_file(self, current_file):
+        """Same as `array_from_file` but also returns frame ranges
+
+        Returns
+        -------
+        segments : SegmentArray
+        start_frame, n_frames : (n_segments, ) np.ndarray
+            Range of `frames` covered by each segment.
+        """
+        if self.frames is None:
+            raise ValueError('"frames" sliding window must be provided.')
+        segments = self.array_from_file(current_file)
+        fixed = self.duration \
+            if self.heterogeneous or not self.variable_length_ else None
+        start_frame, n_frames = segments.to_frames(self.frames, fixed=fixed)
+        return segments, start_frame, n_frames
+
+    def array_from_file(self, current_file):
+        """Same as `from_file` but returns all segments as a `SegmentArray`"""
+        return cached_plan(self, current_file,
+                           lambda: self.plan_from_file(current_file))
+
+    def plan_from_file(self, current_file):
+        """Same as `array_from_file`, bypassing plan cache"""
 
         from_annotation = current_file['annotation']
+        support = self.get_support(current_file)
+
+        if self.heterogeneous:
+            segments = self.array_heterogeneous_segments(from_annotation,
+                                                         support)
+        else:
+            segments = self.array_segments(from_annotation)
+
+        if self.skip_unlabeled:
+            segments = segments[segments.label >= 0]
+
+        if self.snap:
+            segments = segments.snap(self.frames)
+
+        return segments
+
+    def get_support(self, current_file):
+        """Get support the window slides over (according to `source`)"""
 
         if self.source == 'annotated':
+            from pyannote.database.util import get_annotated
             support = get_annotated(current_file)
 
         elif self.source == 'support':
@@ -311,59 +843,124 @@ class SlidingLabeledSegments(object):
             support = current_file['annotation']
 
         elif self.source == 'audio':
-            from pyannote.audio.features.utils import get_audio_duration
-            support = get_audio_duration(current_file)
+            support = get_audio_duration(current_file,
+                                         durations=self.durations)
 
         else:
             raise ValueError(
                 'source must be one of "annotated", "annotation", "support" '
                 'or "audio"')
 
-        if self.heterogeneous:
-            generator = self.iter_heterogeneous_segments(from_annotation,
-                                                         support)
-        else:
-            generator = self.iter_segments(from_annotation)
+        return support
+
+    def bounds_from_file(self, current_file):
+        """Get start and end times of segments the window slides over
+
+        Returns
+        -------
+        start, end : (n_segments, ) np.ndarray
+            None when the number of yielded segments cannot be deduced from
+            them (i.e. when unlabeled heterogeneous segments are skipped).
+        """
 
-        for segment, label in generator:
-            if label is None and self.skip_unlabeled:
+        if self.heterogeneous:
+            if self.skip_unlabeled:
+                return None
+            generator = SlidingSegments(duration=self.duration,
+                                        step=self.step)
+            return generator.get_bounds(self.get_support(current_file))
+
+        start, end = [], []
+        for segment, _, label in current_file['annotation'].itertracks(
+                label=True):
+            if self.skip_unlabeled and label is None:
                 continue
-            yield segment, label
+            start.append(segment.start)
+            end.append(segment.end)
+        return (np.array(start, dtype=np.float64),
+                np.array(end, dtype=np.float64))
 
-    def iter_segments(self, from_annotation):
+    def count_bounds(self, start, end):
+        """Number of segments yielded for each of the provided bounds
 
-        for segment, _, label in from_annotation.itertracks(label=True):
+        Parameters
+        ----------
+        start, end : (n_segments, ) np.ndarray
+            As returned by `bounds_from_file`.
 
-            # skip segments that are too short
-            if segment.duration < self.min_duration:
-                continue
+        Returns
+        -------
+        n_segments : (n_segments, ) np.ndarray
+        """
+        if self.heterogeneous:
+            return count_windows(start, end, self.duration, self.step)
+        min_duration = self.min_duration if self.variable_length_ else None
+        return count_windows(start, end, self.duration, self.step,
+                             min_duration=min_duration, crop=True)
+
+    def count_segments(self, from_annotation):
+        """Same as `len(list(iter_segments(from_annotation)))`"""
+        start, end = [], []
+        for segment, _ in from_annotation.itertracks():
+            start.append(segment.start)
+            end.append(segment.end)
+        # iter_segments always slides over tracks (even when heterogeneous)
+        min_duration = self.min_duration if self.variable_length_ else None
+        return int(np.sum(count_windows(start, end, self.duration, self.step,
+                                        min_duration=min_duration,
+                                        crop=True)))
+
+    def count_from_file(self, current_file):
+        """Same as `len(list(from_file(current_file)))`, without iterating
+
+        Falls back to actually generating segments when unlabeled
+        heterogeneous segments are skipped.
+        """
+        bounds = self.bounds_from_file(current_file)
+        if bounds is None:
+            return len(self.array_from_file(current_file))
+        return int(np.sum(self.count_bounds(*bounds)))
 
-            # yield segments shorter than duration
-            # when variable length segments are allowed
-            elif segment.duration < self.duration:
-                if self.variable_length_:
-                    yield (segment, label)
+    def iter_segments(self, from_annotation):
+        for segment, label in self.array_segments(from_annotation):
+            yield segment, label
 
-            # yield sliding segments within current track
-            else:
-                window = SlidingWindow(
-                    duration=self.duration, step=self.step,
-                    start=segment.start, end=segment.end)
+    def array_segments(self, from_annotation):
+        """Same as `iter_segments` but returns all segments as a `SegmentArray`
 
-                for s in window:
+        Parameters
+        ----------
+        from_annotation : Annotation
 
-                    # if current window is fully contained by segment
-                    if s in segment:
-                        yield (s, label)
+        Returns
+        -------
+        segments : SegmentArray
+            Labeled segments.
+        """
 
-                    # if it is not but variable length segments are allowed
-                    elif self.variable_length_:
-                        candidate = s & segment
-                        if candidate.duration >= self.min_duration:
-                            yield (candidate, label)
-                        break
+        start, end, labels = [], [], []
+        for segment, _, label in from_annotation.itertracks(label=True):
+            start.append(segment.start)
+            end.append(segment.end)
+            labels.append(label)
+        codes, vocabulary = encode_labels(labels)
+
+        min_duration = self.min_duration if self.variable_length_ else None
+        start, end, index = sliding_windows(start, end,
+                                            self.duration, self.step,
+                                            min_duration=min_duration,
+                                            crop=True)
+        return SegmentArray(start, end, label=codes[index],
+                            vocabulary=vocabulary)
 
     def iter_heterogeneous_segments(self, from_annotation, support):
+        segments = self.array_heterogeneous_segments(from_annotation, support)
+        for segment, label in segments:
+            yield segment, label
+
+    def array_heterogeneous_segments(self, from_annotation, support):
+        """Same as `iter_heterogeneous_segments` but returns a `SegmentArray`
+        """
 
         if None in from_annotation.labels():
             raise ValueError(
@@ -387,18 +984,41 @@ class SlidingLabeledSegments(object):
             raise TypeError(
                 'source must be float, Segment, Timeline or Annotation')
 
-        # fill gaps with tracks labels as None
+        # merge contiguous tracks with same label
         annotation = from_annotation.support()
-        gaps = annotation.get_timeline().gaps(support=support)
-        for gap in gaps:
-            annotation[gap] = None
+        tracks = list(annotation.itertracks(label=True))
+        start = np.array([segment.start for segment, _, _ in tracks],
+                         dtype=np.float64)
+        end = np.array([segment.end for segment, _, _ in tracks],
+                       dtype=np.float64)
+
+        # label codes follow annotation.labels() order so that
+        # ties are broken the same way Annotation.argmax does
+        labels = sorted(set(label for _, _, label in tracks) | {None},
+                        key=str)
+        mapping = {label: c for c, label in enumerate(labels)}
+        codes = np.array([mapping[label] for _, _, label in tracks],
+                         dtype=np.int64)
+
+        # fill gaps with tracks labeled as None
+        gap_start, gap_end = gaps(start, end, support)
+        start = np.hstack([start, gap_start])
+        end = np.hstack([end, gap_end])
+        codes = np.hstack([codes, np.full(len(gap_start), mapping[None],
+                                          dtype=np.int64)])
 
         generator = SlidingSegments(duration=self.duration, step=self.step)
+        windows = generator.array_segments(support)
 
-        for segment in generator.iter_segments(support):
-            # majority label
-            label = annotation.argmax(support=segment)
-            yield segment, label
+        # majority label
+        majority = majority_labels(windows.start, windows.end,
+                                   start, end, codes)
+
+        # re-encode labels with None as -1
+        lookup, vocabulary = encode_labels(labels)
+        lookup = np.append(lookup, -1)
+        return SegmentArray(windows.start, windows.end,
+                            label=lookup[majority], vocabulary=vocabulary)
 
 
 class RandomLabeledSegments(object):
@@ -413,51 +1033,111 @@ class RandomLabeledSegments(object):
         Defaults to 1.
     max_duration: float, optional
         Defaults to 5.
+    frames : SlidingWindow, optional
+        Feature sliding window. When provided, `frames_from_file` can be used
+        to get the range of frames covered by each segment.
+    cache : PlanCache, optional
+        When provided, cache per-file plans across epochs.
+    rng : np.random.Generator, RandomStreams or int, optional
+        Random generator, random streams (one stream per file) or seed of
+        random streams. Defaults to numpy global random state.
     """
 
-    def __init__(self, min_duration=1., max_duration=5):
+    def __init__(self, min_duration=1., max_duration=5, frames=None,
+                 cache=None, rng=None):
         super(RandomLabeledSegments, self).__init__()
         self.min_duration = min_duration
         self.max_duration = max_duration
+        self.frames = frames
+        self.cache = cache
+        self.rng = check_rng(rng)
 
     def from_file(self, current_file):
-        annotation = current_file['annotation']
-        for segment in self.iter_segments(annotation):
+        for segment in self.array_from_file(current_file):
             yield segment
 
-    def iter_segments(self, from_annotation):
+    def array_from_file(self, current_file):
+        """Same as `from_file` but returns all segments as a `SegmentArray`"""
+        tracks = cached_plan(self, current_file,
+                             lambda: self.plan_from_file(current_file))
+        return self.draw(tracks, rng=file_rng(self.rng, current_file))
+
+    def plan_from_file(self, current_file):
+        """Get tracks long enough to be used as a `SegmentArray`"""
+        return self.get_tracks(current_file['annotation'])
+
+    def frames_from_file(self, current_file):
+        """Same as `array_from_file` but also returns frame ranges
+
+        Returns
+        -------
+        segments : SegmentArray
+        start_frame, n_frames : (n_segments, ) np.ndarray
+            Range of `frames` covered by each segment.
         """
+        if self.frames is None:
+            raise ValueError('"frames" sliding window must be provided.')
+        segments = self.array_from_file(current_file)
+        start_frame, n_frames = segments.to_frames(self.frames)
+        return segments, start_frame, n_frames
+
+    def array_segments(self, from_annotation):
+        """Same as `iter_segments` but returns all segments as a `SegmentArray`
+
         Parameters
         ----------
         from_annotation : Annotation
 
         Returns
         -------
-        segment
-        label
-
+        segments : SegmentArray
+            Labeled segments.
         """
 
-        for segment, _, label in from_annotation.itertracks(label=True):
+        return self.draw(self.get_tracks(from_annotation))
+
+    def get_tracks(self, from_annotation):
+        """Get tracks long enough to be used as a `SegmentArray`"""
 
+        tracks = []
+        for segment, _, label in from_annotation.itertracks(label=True):
             # no need to continue if segment is shorter than minimum duration
-            duration = segment.duration
-            if duration < self.min_duration:
+            if segment.duration < self.min_duration:
                 continue
+            tracks.append((segment, label))
+        return SegmentArray.from_segments(tracks, labeled=True)
 
-            # initialize random subsegment generator
-            generator = random_subsegment(segment,
-                                          self.max_duration,
-                                          min_duration=self.min_duration)
+    def draw(self, tracks, rng=None):
+        """Draw random subsegments of `tracks` as a `SegmentArray`"""
 
-            # number of subsegments is proportional
-            # to the duration of the original segment
-            n_subsegments = int(np.ceil(duration / self.min_duration))
+        # number of subsegments is proportional
+        # to the duration of the original segment
+        n_subsegments = np.ceil(tracks.duration / self.min_duration)
 
-            # actual generate random subsegments
-            for _ in range(n_subsegments):
-                s = next(generator)
-                yield (s, label)
+        # actual generate random subsegments
+        start, end, index = random_subsegments(
+            tracks.start, tracks.end, self.max_duration,
+            min_duration=self.min_duration,
+            size=n_subsegments.astype(np.int64),
+            rng=get_rng(self.rng if rng is None else rng))
+
+        return SegmentArray(start, end, label=tracks.label[index],
+                            vocabulary=tracks.vocabulary)
+
+    def iter_segments(self, from_annotation):
+        """
+        Parameters
+        ----------
+        from_annotation : Annotation
+
+        Returns
+        -------
+        segment
+        label
+
+        """
+        for segment, label in self.array_segments(from_annotation):
+            yield segment, label
 
 
 class RandomSegments(object):
@@ -471,21 +1151,87 @@ class RandomSegments(object):
     weighted: boolean, optional
         When True, probability of generating a segment is proportional to its
         duration.
+    batch_size: int, optional
+        Number of random segments drawn at once. Defaults to 1024.
+    frames : SlidingWindow, optional
+        Feature sliding window. When provided, `frames_from_file` can be used
+        to get the range of frames covered by each segment.
+    cache : PlanCache, optional
+        When provided, cache per-file plans across epochs.
+    rng : np.random.Generator, RandomStreams or int, optional
+        Random generator, random streams (one stream per file) or seed of
+        random streams. Defaults to numpy global random state.
     """
-    def __init__(self, duration=0., weighted=False):
+    def __init__(self, duration=0., weighted=False, batch_size=1024,
+                 frames=None, cache=None, rng=None):
         super(RandomSegments, self).__init__()
         self.duration = duration
         self.weighted = weighted
+        self.batch_size = batch_size
+        self.frames = frames
+        self.cache = cache
+        self.rng = check_rng(rng)
 
     def pick(self, segment):
         """Pick a subsegment at random"""
-        t = segment.start + np.random.random() * (segment.duration - self.duration)
+        rng = get_rng(self.rng)
+        t = segment.start + rng.random() * (segment.duration - self.duration)
         return Segment(t, t + self.duration)
 
     def from_file(self, current_file):
-        annotation = current_file['annotation']
-        for segment in self.iter_segments(annotation):
-            yield segment
+        draw = self.sampler_from_file(current_file)
+        while True:
+            for segment in draw(self.batch_size):
+                yield segment
+
+    def array_from_file(self, current_file, n_segments):
+        """Draw `n_segments` random segments as a `SegmentArray`"""
+        draw = self.sampler_from_file(current_file)
+        return draw(n_segments)
+
+    def sampler_from_file(self, current_file):
+        """Same as `get_sampler` for file annotation, using plan cache"""
+        plan = cached_plan(self, current_file,
+                           lambda: self.plan_from_file(current_file))
+        return self.get_sampler_from_plan(
+            plan, rng=file_rng(self.rng, current_file))
+
+    def plan_from_file(self, current_file):
+        """Same as `get_plan` for file annotation, bypassing plan cache"""
+        return self.get_plan(current_file['annotation'])
+
+    def frames_from_file(self, current_file, n_segments):
+        """Same as `array_from_file` but also returns frame ranges
+
+        Returns
+        -------
+        segments : SegmentArray
+        start_frame, n_frames : (n_segments, ) np.ndarray
+            Range of `frames` covered by each segment.
+        """
+        if self.frames is None:
+            raise ValueError('"frames" sliding window must be provided.')
+        segments = self.array_from_file(current_file, n_segments)
+        fixed = self.duration if self.duration else None
+        start_frame, n_frames = segments.to_frames(self.frames, fixed=fixed)
+        return segments, start_frame, n_frames
+
+    def array_segments(self, source, n_segments):
+        """Draw `n_segments` random segments as a `SegmentArray`
+
+        Parameters
+        ----------
+        source : float, Segment, Timeline or Annotation
+            See `iter_segments`.
+        n_segments : int
+            Number of random segments.
+
+        Returns
+        -------
+        segments : SegmentArray
+        """
+        draw = self.get_sampler(source)
+        return draw(n_segments)
 
     def iter_segments(self, source):
         """
@@ -497,6 +1243,42 @@ class RandomSegments(object):
             If `Timeline`, yield random segments within this timeline.
             If `Annotation`, yield random segments within its timeline.
         """
+        draw = self.get_sampler(source)
+        while True:
+            for segment in draw(self.batch_size):
+                yield segment
+
+    def get_sampler(self, source):
+        """Get random segments sampler
+
+        Parameters
+        ----------
+        source : float, Segment, Timeline or Annotation
+            See `iter_segments`.
+
+        Returns
+        -------
+        draw : callable
+            draw(n_segments) returns `n_segments` random segments
+            as a `SegmentArray`.
+        """
+        return self.get_sampler_from_plan(self.get_plan(source))
+
+    def get_plan(self, source):
+        """Get candidate segments (and their sampling table)
+
+        Parameters
+        ----------
+        source : float, Segment, Timeline or Annotation
+            See `iter_segments`.
+
+        Returns
+        -------
+        start, end : (n_candidates, ) np.ndarray
+            Candidate segments (longer than `duration`).
+        table : AliasTable or None
+            Duration-weighted sampling table. None when not `weighted`.
+        """
 
         if isinstance(source, Annotation):
             segments = source.get_timeline()
@@ -510,7 +1292,7 @@ class RandomSegments(object):
         elif isinstance(source, (int, float)):
             if not self.duration > 0:
                 raise ValueError('Duration must be strictly positive.')
-            segments = [Segment(0, duration)]
+            segments = [Segment(0, source)]
 
         else:
             raise TypeError(
@@ -524,13 +1306,36 @@ class RandomSegments(object):
                 'Source must contain at least one segment longer '
                 'than requested duration.')
 
-        for segment in random_segment(segments, weighted=self.weighted):
-            if self.duration:
-                if segment.duration < self.duration:
-                    continue
-                yield next(random_subsegment(segment, self.duration))
-            else:
-                yield segment
+        start = np.array([segment.start for segment in segments],
+                         dtype=np.float64)
+        end = np.array([segment.end for segment in segments],
+                       dtype=np.float64)
+
+        table = AliasTable(end - start) if self.weighted else None
+        return start, end, table
+
+    def get_sampler_from_plan(self, plan, rng=None):
+        """Same as `get_sampler` but for a plan returned by `get_plan`"""
+
+        start, end, table = plan
+        rng = get_rng(self.rng if rng is None else rng)
+
+        if table is not None:
+            def pick(size):
+                return table.draw(size=size, rng=rng)
+        else:
+            def pick(size):
+                return rng.integers(len(start), size=size)
+
+        def draw(n_segments):
+            i = pick(n_segments)
+            if not self.duration:
+                return SegmentArray(start[i], end[i])
+            sub_start, sub_end, _ = random_subsegments(
+                start[i], end[i], self.duration, rng=rng)
+            return SegmentArray(sub_start, sub_end)
+
+        return draw
 
 
 class RandomSegmentsPerLabel(object):
@@ -547,19 +1352,33 @@ class RandomSegmentsPerLabel(object):
     yield_label: boolean, optional
         When True, yield triplets of (segment, label) pairs
         Defaults to yielding segments.
+    cache : PlanCache, optional
+        When provided, cache per-file plans across epochs.
+    rng : np.random.Generator, RandomStreams or int, optional
+        Random generator, random streams (one stream per file) or seed of
+        random streams. Defaults to numpy global random state.
     """
 
-    def __init__(self, per_label=40, duration=0.0, yield_label=False):
+    def __init__(self, per_label=40, duration=0.0, yield_label=False,
+                 cache=None, rng=None):
         super(RandomSegmentsPerLabel, self).__init__()
         self.per_label = per_label
         self.duration = duration
         self.yield_label = yield_label
+        self.cache = cache
+        self.rng = check_rng(rng)
 
     def from_file(self, current_file):
-        annotation = current_file['annotation']
-        for segment in self.iter_segments(annotation):
+        plan = cached_plan(self, current_file,
+                           lambda: self.plan_from_file(current_file))
+        rng = file_rng(self.rng, current_file)
+        for segment in self.iter_plan(plan, rng=rng):
             yield segment
 
+    def plan_from_file(self, current_file):
+        """Same as `get_plan` for file annotation, bypassing plan cache"""
+        return self.get_plan(current_file['annotation'])
+
     def iter_segments(self, from_annotation):
         """Yield segments
 
@@ -568,19 +1387,48 @@ class RandomSegmentsPerLabel(object):
         from_annotation : Annotation
             Annotation from which segments are obtained.
         """
+        for segment in self.iter_plan(self.get_plan(from_annotation)):
+            yield segment
+
+    def get_random_segments(self):
+        return RandomSegments(duration=self.duration, weighted=True,
+                              batch_size=self.per_label)
+
+    def get_plan(self, from_annotation):
+        """Get per-label `RandomSegments` plans
+
+        Parameters
+        ----------
+        from_annotation : Annotation
+            Annotation from which segments are obtained.
+
+        Returns
+        -------
+        plan : list
+            List of (label, plan) tuples where plan is the one returned by
+            `RandomSegments.get_plan` for this label.
+        """
+
+        random_segments = self.get_random_segments()
 
-        labels = from_annotation.labels()
-        random_segments = RandomSegments(duration=self.duration, weighted=True)
-        for label in labels:
+        plan = []
+        for label in from_annotation.labels():
             timeline = from_annotation.label_timeline(label)
             if self.duration > 0:
                 timeline = remove_short_segment(timeline, self.duration)
                 if not timeline:
                     continue
-            segments = random_segments.iter_segments(timeline)
-            for s, segment in enumerate(segments):
-                if s == self.per_label:
-                    break
+            plan.append((label, random_segments.get_plan(timeline)))
+        return plan
+
+    def iter_plan(self, plan, rng=None):
+        """Yield `per_label` segments for each label of `plan`"""
+
+        rng = get_rng(self.rng if rng is None else rng)
+        random_segments = self.get_random_segments()
+        for label, label_plan in plan:
+            draw = random_segments.get_sampler_from_plan(label_plan, rng=rng)
+            for segment in draw(self.per_label):
                 yield (segment, label) if self.yield_label else segment
 
 
@@ -592,36 +1440,46 @@ class RandomTracks(object):
     yield_label: boolean, optional
         When True, yield (segment, track, label) tuples.
         Defaults to yielding (segment, track) tuples.
+    batch_size: int, optional
+        Number of random tracks drawn at once. Defaults to 1024.
+    rng : np.random.Generator, RandomStreams or int, optional
+        Random generator, random streams (one stream per file) or seed of
+        random streams. Defaults to numpy global random state.
     """
 
-    def __init__(self, yield_label=False):
+    def __init__(self, yield_label=False, batch_size=1024, rng=None):
         super(RandomTracks, self).__init__()
         self.yield_label = yield_label
+        self.batch_size = batch_size
+        self.rng = check_rng(rng)
 
     def from_file(self, current_file):
         annotation = current_file['annotation']
-        for track in self.iter_tracks(reference):
+        rng = file_rng(self.rng, current_file)
+        for track in self.iter_tracks(annotation, rng=rng):
             yield track
 
-    def iter_tracks(self, from_annotation):
+    def iter_tracks(self, from_annotation, rng=None):
         """Yield (segment, track) tuples
 
         Parameters
         ----------
         from_annotation : Annotation
             Annotation from which tracks are obtained.
+        rng : np.random.Generator, optional
+            Defaults to `rng` generator parameter.
         """
-        segments = from_annotation.get_timeline()
-        n_segments = len(segments)
+        rng = get_rng(self.rng if rng is None else rng)
+        index = TrackIndex(from_annotation)
         while True:
-            index = np.random.randint(n_segments)
-            segment = segments[index]
-            track = np.random.choice(list(from_annotation.get_tracks(segment)))
-            if self.yield_label:
-                label = from_annotation[segment, track]
-                yield segment, track, label
-            else:
-                yield segment, track
+            for i in index.draw(self.batch_size, rng=rng):
+                segment = index.get_segment(i)
+                track = index.track[i]
+                if self.yield_label:
+                    label = index.get_label(i)
+                    yield segment, track, label
+                else:
+                    yield segment, track
 
 
 class RandomTrackTriplets(object):
@@ -636,42 +1494,45 @@ class RandomTrackTriplets(object):
         When True, yield triplets of (segment, track, label) tuples.
         Defaults to yielding triplets of (segment, track) tuples.
         Useful for logging which labels are more difficult to discriminate.
+    rng : np.random.Generator, RandomStreams or int, optional
+        Random generator, random streams (one stream per file) or seed of
+        random streams. Defaults to numpy global random state.
     """
 
-    def __init__(self, per_label=40, yield_label=False):
+    def __init__(self, per_label=40, yield_label=False, rng=None):
         super(RandomTrackTriplets, self).__init__()
         self.per_label = per_label
         self.yield_label = yield_label
+        self.rng = check_rng(rng)
 
     def from_file(self, current_file):
         annotation = current_file['annotation']
-        for triplet in self.iter_triplets(annotation):
+        rng = file_rng(self.rng, current_file)
+        for triplet in self.iter_triplets(annotation, rng=rng):
             yield triplet
 
-    def iter_triplets(self, from_annotation):
+    def iter_triplets(self, from_annotation, rng=None):
         """Yield (anchor, positive, negative) triplets of tracks
 
         Parameters
         ----------
         from_annotation : Annotation
             Annotation from which triplets are obtained.
+        rng : np.random.Generator, optional
+            Defaults to `rng` generator parameter.
         """
-        for label in from_annotation.labels():
 
-            p = RandomTracks(yield_label=self.yield_label)
-            positives = p.iter_tracks(from_annotation.subset([label]))
+        rng = get_rng(self.rng if rng is None else rng)
+        index = TrackIndex(from_annotation)
 
-            n = RandomTracks(yield_label=self.yield_label)
-            negatives = n.iter_tracks(from_annotation.subset([label], invert=True))
+        def get_track(i):
+            segment, track = index.get_segment(i), index.track[i]
+            if self.yield_label:
+                return segment, track, index.get_label(i)
+            return segment, track
 
-            for _ in range(self.per_label):
-                try:
-                    anchor = next(positives)
-                    positive = next(positives)
-                    negative = next(negatives)
-                except StopIteration as e:
-                    break
-                yield anchor, positive, negative
+        for a, p, n in zip(*index.draw_triplets(self.per_label, rng=rng)):
+            yield get_track(a), get_track(p), get_track(n)
 
 
 class RandomSegmentTriplets(object):
@@ -689,61 +1550,84 @@ class RandomSegmentTriplets(object):
         When True, yield triplets of (segment, label) tuples.
         Default to yielding segment triplets.
         Useful for logging which labels are more difficult to discriminate.
+    rng : np.random.Generator, RandomStreams or int, optional
+        Random generator, random streams (one stream per file) or seed of
+        random streams. Defaults to numpy global random state.
     """
 
-    def __init__(self, duration=0., per_label=40, yield_label=False):
+    def __init__(self, duration=0., per_label=40, yield_label=False,
+                 rng=None):
         super(RandomSegmentTriplets, self).__init__()
         self.duration = duration
         self.per_label = per_label
         self.yield_label = yield_label
+        self.rng = check_rng(rng)
 
     def pick(self, segment):
         """Pick a subsegment at random"""
+        rng = get_rng(self.rng)
         t = segment.start + \
-            np.random.random() * (segment.duration - self.duration)
+            rng.random() * (segment.duration - self.duration)
         return Segment(t, t + self.duration)
 
     def from_file(self, current_file):
         annotation = current_file['annotation']
-        for triplet in self.iter_triplets(annotation):
+        rng = file_rng(self.rng, current_file)
+        for triplet in self.iter_triplets(annotation, rng=rng):
             yield triplet
 
-    def iter_triplets(self, from_annotation):
+    def iter_triplets(self, from_annotation, rng=None):
         """Yield (anchor, positive, negative) segment triplets
 
         Parameters
         ----------
         from_annotation : Annotation
             Annotation from which triplets are obtained.
+        rng : np.random.Generator, optional
+            Defaults to `rng` generator parameter.
         """
 
-        t = RandomTrackTriplets(per_label=self.per_label,
-                                yield_label=self.yield_label)
+        triplets = self.array_triplets(from_annotation, rng=rng)
+        if triplets is None:
+            return
 
-        annotation = Annotation(uri=from_annotation.uri,
-                                modality=from_annotation.modality)
-        for segment, track, label in from_annotation.itertracks(label=True):
-            if segment.duration < self.duration:
-                continue
-            annotation[segment, track] = label
+        for a, p, n in zip(*triplets):
+            if self.yield_label:
+                yield a, p, n
+            else:
+                yield a[0], p[0], n[0]
 
-        if len(annotation.labels()) < 2:
-            return
+    def array_triplets(self, from_annotation, rng=None):
+        """Draw all (anchor, positive, negative) segment triplets at once
 
-        triplets = t.iter_triplets(annotation)
+        Parameters
+        ----------
+        from_annotation : Annotation
+            Annotation from which triplets are obtained.
+        rng : np.random.Generator, optional
+            Defaults to `rng` generator parameter.
 
-        for triplet in triplets:
+        Returns
+        -------
+        anchor, positive, negative : SegmentArray
+            Labeled segments. None when annotation contains less than two
+            labels (with long enough tracks).
+        """
 
-            a, p, n = [item[0] for item in triplet]
+        rng = get_rng(self.rng if rng is None else rng)
+        index = TrackIndex(from_annotation, min_duration=self.duration)
+        if len(index.vocabulary) < 2:
+            return None
 
+        triplets = []
+        for i in index.draw_triplets(self.per_label, rng=rng):
+            segments = index.get_segments(i)
             if self.duration:
-                a, p, n = [self.pick(s) for s in (a, p, n)]
+                segments.start, segments.end, _ = random_subsegments(
+                    segments.start, segments.end, self.duration, rng=rng)
+            triplets.append(segments)
 
-            if self.yield_label:
-                a_, p_, n_ = [item[2] for item in triplet]
-                yield (a, a_), (p, p_), (n, n_)
-            else:
-                yield a, p, n
+        return tuple(triplets)
 
 
 class RandomSegmentPairs(object):
@@ -764,33 +1648,81 @@ class RandomSegmentPairs(object):
         When True, yield triplets of (segment, label) tuples.
         Default to yielding segment triplets.
         Useful for logging which labels are more difficult to discriminate.
+    rng : np.random.Generator, RandomStreams or int, optional
+        Random generator, random streams (one stream per file) or seed of
+        random streams. Defaults to numpy global random state.
 
     """
-    def __init__(self, duration=0., per_label=40, yield_label=False):
+    def __init__(self, duration=0., per_label=40, yield_label=False,
+                 rng=None):
         super(RandomSegmentPairs, self).__init__()
         self.duration = duration
         self.per_label = per_label
         self.yield_label = yield_label
+        self.rng = check_rng(rng)
 
     def from_file(self, current_file):
         annotation = current_file['annotation']
-        for pair in self.iter_pairs(annotation):
+        rng = file_rng(self.rng, current_file)
+        for pair in self.iter_pairs(annotation, rng=rng):
             yield pair
 
-    def iter_pairs(self, from_annotation):
+    def iter_pairs(self, from_annotation, rng=None):
         """Yield ((query, returned), relevance)
 
         Parameters
         ----------
         from_annotation : Annotation
             Annotation from which triplets are obtained.
+        rng : np.random.Generator, optional
+            Defaults to `rng` generator parameter.
         """
 
-        t = RandomSegmentTriplets(duration=self.duration,
-                                  per_label=self.per_label,
-                                  yield_label=self.yield_label)
-        triplets = t.iter_triplets(from_annotation)
+        pairs = self.array_pairs(from_annotation, rng=rng)
+        if pairs is None:
+            return
+
+        query, returned, relevance = pairs
+        for q, r, relevant in zip(query, returned, relevance.tolist()):
+            if self.yield_label:
+                yield [(q, r), relevant]
+            else:
+                yield [(q[0], r[0]), relevant]
+
+    def array_pairs(self, from_annotation, rng=None):
+        """Draw all ((query, returned), relevance) pairs at once
 
-        for query, positive, negative in triplets:
-            yield [(query, positive), True]
-            yield [(query, negative), False]
+        Parameters
+        ----------
+        from_annotation : Annotation
+            Annotation from which pairs are obtained.
+        rng : np.random.Generator, optional
+            Defaults to `rng` generator parameter.
+
+        Returns
+        -------
+        query, returned : SegmentArray
+            Labeled segments. None when annotation contains less than two
+            labels (with long enough tracks).
+        relevance : (n_pairs, ) np.ndarray
+            Boolean array (True when `returned` has the same label as `query`)
+        """
+
+        t = RandomSegmentTriplets(duration=self.duration,
+                                  per_label=self.per_label)
+        rng = get_rng(self.rng if rng is None else rng)
+        triplets = t.array_triplets(from_annotation, rng=rng)
+        if triplets is None:
+            return None
+
+        # interleave (anchor, positive) and (anchor, negative) pairs
+        anchor, positive, negative = triplets
+        n_triplets = len(anchor)
+        query = anchor[np.repeat(np.arange(n_triplets), 2)]
+        returned = SegmentArray.concatenate([positive, negative])
+        order = np.vstack([np.arange(n_triplets),
+                           n_triplets + np.arange(n_triplets)]).T.reshape(-1)
+        returned = returned[order]
+        relevance = np.tile([True, False], n_triplets)
+
+        return query, returned, relevance
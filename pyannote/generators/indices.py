@@ -27,11 +27,282 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 
+import os
+import mmap
+import hashlib
 import warnings
 import numpy as np
+from .alias import AliasTable
+from .rng import get_rng
 
 
-def random_label_index(y, per_label=3, repeat=True, return_label=False):
+def index_labels(y, per_label=3, root_dir=None, chunk_size=None,
+                 version=None):
+    """Index sequences by label
+
+    Parameters
+    ----------
+    y : array-like
+        Labels. Memory-mapped (or any sliceable) arrays can be processed
+        chunk by chunk (see `chunk_size`), without ever loading `y` fully.
+    per_label : int, optional
+        Warn when some labels have less than `per_label` samples.
+        Defaults to 3.
+    root_dir : str, optional
+        When provided, the index is stored in this directory as ".npy" files
+        and reopened (memory-mapped) from there next time. It is rebuilt
+        when it was built from different labels (see `label_fingerprint`).
+        In-place shuffles of `sequences` are never written back to disk.
+    chunk_size : int, optional
+        Build index out of core, processing `y` in chunks of that many
+        samples. Defaults to 2 ** 20 when `y` is memory-mapped or `root_dir`
+        is provided, and to loading `y` fully in memory otherwise.
+    version : optional
+        Version of labels (e.g. dataset release) used to check that the
+        index stored in `root_dir` is up to date, instead of looking at `y`.
+        See `label_fingerprint`.
+
+    Returns
+    -------
+    unique : (n_labels, ) np.ndarray
+        Sorted unique labels.
+    counts : (n_labels, ) np.ndarray
+        Number of samples per label.
+    sequences : (n_samples, ) np.ndarray
+        Sequences sorted by label: sequences with label `l` are
+        sequences[offsets[l]:offsets[l + 1]]. Use views of this buffer
+        to shuffle sequences of one label in place.
+    offsets : (n_labels + 1, ) np.ndarray
+    """
+
+    index, fingerprint = None, None
+    if root_dir is not None:
+        fingerprint = label_fingerprint(y, version=version)
+        index = load_label_index(root_dir, len(y), fingerprint=fingerprint)
+        if index is None and \
+           os.path.isfile(os.path.join(root_dir, 'offsets.npy')):
+            msg = 'Rebuilding label index in "{root_dir}" (labels changed).'
+            warnings.warn(msg.format(root_dir=root_dir))
+            # index is no longer complete
+            os.remove(os.path.join(root_dir, 'offsets.npy'))
+
+    if index is None:
+        if chunk_size is None and \
+           (root_dir is not None or isinstance(y, np.memmap)):
+            chunk_size = 2 ** 20
+        if chunk_size is None:
+            index = _index_labels(y)
+        else:
+            index = _stream_index_labels(y, chunk_size, root_dir=root_dir,
+                                         fingerprint=fingerprint)
+
+    unique, counts, sequences, offsets = index
+    n_labels = len(unique)
+
+    # warn that some labels have very few training samples
+    too_few_samples = np.sum(counts < per_label)
+    if too_few_samples > 0:
+        msg = '{n} labels (out of {N}) have less than {per_label} training samples.'
+        warnings.warn(msg.format(n=too_few_samples,
+                                 N=n_labels,
+                                 per_label=per_label))
+
+    return unique, counts, sequences, offsets
+
+
+def _sequences_dtype(n_samples):
+    return np.int32 if n_samples < np.iinfo(np.int32).max else np.int64
+
+
+def _index_labels(y):
+
+    # unique labels
+    unique, y, counts = np.unique(y, return_inverse=True, return_counts=True)
+
+    # a single (stable) sort instead of one pass over y per label
+    dtype = _sequences_dtype(len(y))
+    sequences = np.argsort(y, kind='stable').astype(dtype, copy=False)
+    offsets = np.hstack([[0], np.cumsum(counts)])
+
+    return unique, counts, sequences, offsets
+
+
+def _stream_index_labels(y, chunk_size, root_dir=None, fingerprint=None):
+
+    n_samples = len(y)
+
+    # first pass: unique labels and their counts
+    unique, counts = None, None
+    for start in range(0, n_samples, chunk_size):
+        u, c = np.unique(np.asarray(y[start:start + chunk_size]),
+                         return_counts=True)
+        if unique is None:
+            unique, counts = u, c
+            continue
+        merged = np.union1d(unique, u)
+        merged_counts = np.zeros(len(merged), dtype=np.int64)
+        merged_counts[np.searchsorted(merged, unique)] += counts
+        merged_counts[np.searchsorted(merged, u)] += c
+        unique, counts = merged, merged_counts
+
+    if unique is None:
+        unique = np.array(y[:0])
+        counts = np.zeros(0, dtype=np.int64)
+    counts = counts.astype(np.int64)
+    offsets = np.hstack([[0], np.cumsum(counts)]).astype(np.int64)
+    n_labels = len(unique)
+
+    # files are written under a temporary name then moved into place, so
+    # that mappings of a previous index (if any) keep the old file
+    dtype = _sequences_dtype(n_samples)
+    if root_dir is None:
+        sequences = np.empty(n_samples, dtype=dtype)
+    else:
+        os.makedirs(root_dir, exist_ok=True)
+        sequences = np.lib.format.open_memmap(
+            os.path.join(root_dir, 'sequences.npy.tmp'), mode='w+',
+            dtype=dtype, shape=(n_samples, ))
+
+    # second pass: same as a stable argsort of label codes
+    # cursor[l] is where next sequence with label l goes
+    cursor = offsets[:-1].copy()
+    for start in range(0, n_samples, chunk_size):
+        codes = np.searchsorted(unique,
+                                np.asarray(y[start:start + chunk_size]))
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        chunk_counts = np.bincount(codes, minlength=n_labels)
+        first = np.cumsum(chunk_counts) - chunk_counts
+        rank = np.arange(len(codes)) - first[sorted_codes]
+        sequences[cursor[sorted_codes] + rank] = start + order
+        cursor += chunk_counts
+
+    if root_dir is None:
+        return unique, counts, sequences, offsets
+
+    sequences.flush()
+    del sequences
+    path = os.path.join(root_dir, 'sequences.npy')
+    os.replace(path + '.tmp', path)
+    _save(root_dir, 'unique.npy', unique)
+    _save(root_dir, 'counts.npy', counts)
+    _save(root_dir, 'fingerprint.txt',
+          label_fingerprint(y) if fingerprint is None else fingerprint)
+    # offsets are written last as they mark the index as complete
+    _save(root_dir, 'offsets.npy', offsets)
+
+    return load_label_index(root_dir, n_samples)
+
+
+def _save(root_dir, name, content):
+    """Atomically (re)write `content` (array or text) to `root_dir`/`name`"""
+    path = os.path.join(root_dir, name)
+    if isinstance(content, str):
+        with open(path + '.tmp', 'w') as fp:
+            fp.write(content)
+    else:
+        with open(path + '.tmp', 'wb') as fp:
+            np.save(fp, content)
+    os.replace(path + '.tmp', path)
+
+
+def label_fingerprint(y, version=None, chunk_size=2 ** 20):
+    """Fingerprint of labels used to check that a stored index is up to date
+
+    Parameters
+    ----------
+    y : array-like
+        Labels. Arrays memory-mapped from a file (e.g. `np.load` with
+        `mmap_mode`) are identified by this file name, offset, size and
+        modification time. Other arrays are hashed entirely.
+    version : optional
+        Explicit version of labels (e.g. dataset release). When provided,
+        the fingerprint only depends on `version` and `y` is not read.
+    chunk_size : int, optional
+        Hash `y` chunk by chunk, by chunks of that many samples.
+        Defaults to 2 ** 20.
+
+    Returns
+    -------
+    fingerprint : str
+    """
+
+    digest = hashlib.sha256()
+
+    if version is not None:
+        digest.update('version|{0}'.format(version).encode('utf-8'))
+        return digest.hexdigest()
+
+    if not hasattr(y, 'dtype'):
+        y = np.asarray(y)
+
+    digest.update('{0}|{1}|'.format(y.dtype.str, y.shape).encode('utf-8'))
+
+    # views of a memory-mapped array share its file name and offset
+    if isinstance(y, np.memmap) and isinstance(y.base, mmap.mmap) and \
+       y.filename is not None:
+        stat = os.stat(y.filename)
+        digest.update('{0}|{1}|{2}|{3}'.format(
+            y.filename, y.offset, stat.st_size,
+            stat.st_mtime_ns).encode('utf-8'))
+        return digest.hexdigest()
+
+    for start in range(0, len(y), chunk_size):
+        values = np.asarray(y[start:start + chunk_size])
+        # object arrays bytes are pointers: hash their text representation
+        if values.dtype.kind == 'O':
+            digest.update(str(values.tolist()).encode('utf-8'))
+        else:
+            digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+def load_label_index(root_dir, n_samples=None, fingerprint=None):
+    """Reopen label index stored by `index_labels`
+
+    Parameters
+    ----------
+    root_dir : str
+        Directory where the index was stored.
+    n_samples : int, optional
+        Expected number of samples.
+    fingerprint : str, optional
+        Expected fingerprint of labels (see `label_fingerprint`).
+
+    Returns
+    -------
+    unique, counts, sequences, offsets :
+        See `index_labels`, with memory-mapped (copy-on-write) `sequences`.
+        None when there is no (complete) index in `root_dir`, or when it
+        does not contain `n_samples` samples or was built from labels with
+        a different `fingerprint`.
+    """
+
+    path = os.path.join(root_dir, '{name}.npy')
+    if not os.path.isfile(path.format(name='offsets')):
+        return None
+
+    offsets = np.load(path.format(name='offsets'))
+    if n_samples is not None and offsets[-1] != n_samples:
+        return None
+
+    if fingerprint is not None:
+        try:
+            with open(os.path.join(root_dir, 'fingerprint.txt'), 'r') as fp:
+                stored = fp.read().strip()
+        except OSError:
+            stored = None
+        if stored != fingerprint:
+            return None
+
+    unique = np.load(path.format(name='unique'))
+    counts = np.load(path.format(name='counts'))
+    sequences = np.load(path.format(name='sequences'), mmap_mode='c')
+    return unique, counts, sequences, offsets
+
+
+def random_label_index(y, per_label=3, repeat=True, return_label=False,
+                       weights=None, root_dir=None, rng=None, version=None):
     """
 
     Parameters
@@ -47,6 +318,20 @@ def random_label_index(y, per_label=3, repeat=True, return_label=False):
     return_label : bool, optional
         Default behavior is to only yield sequence indices. Set to True to
         yield (indice, label) tuples.
+    weights : {'uniform', 'proportional'}, float or dict, optional
+        Default behavior is to visit every label exactly once per loop.
+        Otherwise, draw labels at random according to `weights`. Use 0.5, for
+        instance, to draw labels with probability proportional to the square
+        root of their number of samples. See `LabelIndex`.
+    root_dir : str, optional
+        Build label index out of core and store it in (or reopen it from)
+        this directory. Useful for (memory-mapped) `y` that do not fit in
+        memory. See `index_labels`. Has no effect when `weights` is
+        provided.
+    rng : np.random.Generator or int, optional
+        Random generator (or its seed). Defaults to numpy global random state.
+    version : optional
+        Version of labels stored in `root_dir`. See `index_labels`.
 
     Usage
     -----
@@ -71,20 +356,18 @@ def random_label_index(y, per_label=3, repeat=True, return_label=False):
     12 ==> 2
     """
 
-    # unique labels
-    unique, y, counts = np.unique(y, return_inverse=True, return_counts=True)
-    n_labels = len(unique)
+    rng = get_rng(rng)
 
-    # warn that some labels have very few training samples
-    too_few_samples = np.sum(counts < per_label)
-    if too_few_samples > 0:
-        msg = '{n} labels (out of {N}) have less than {per_label} training samples.'
-        warnings.warn(msg.format(n=too_few_samples,
-                                 N=n_labels,
-                                 per_label=per_label))
+    if weights is not None:
+        index = LabelIndex(y, per_label=per_label, repeat=repeat,
+                           weights=weights, rng=rng)
+        for item in index.iter_indices(return_label=return_label):
+            yield item
+        return
 
-    # shuffled_sequences[label] contains (shuffled) sequences with this label
-    shuffled_sequences = [np.where(y == label)[0] for label in range(n_labels)]
+    unique, counts, sequences, offsets = index_labels(
+        y, per_label, root_dir=root_dir, version=version)
+    n_labels = len(unique)
 
     # consumed[label] keeps track of the number of sequences consumed
     consumed = [0 for label in range(n_labels)]
@@ -95,9 +378,9 @@ def random_label_index(y, per_label=3, repeat=True, return_label=False):
     while True:
 
         # consume all labels in random order
-        for k, label in enumerate(np.random.choice(n_labels,
-                                                   size=n_labels,
-                                                   replace=False)):
+        for k, label in enumerate(rng.choice(n_labels,
+                                             size=n_labels,
+                                             replace=False)):
 
             # corner case where last label of previous loop
             # is the same as first label of current loop
@@ -111,7 +394,7 @@ def random_label_index(y, per_label=3, repeat=True, return_label=False):
             # using pre-shuffled order
             for _ in range(per_this_label):
 
-                i = shuffled_sequences[label][consumed[label]]
+                i = sequences[offsets[label] + consumed[label]]
                 if return_label:
                     yield i, unique[label]
                 else:
@@ -123,6 +406,509 @@ def random_label_index(y, per_label=3, repeat=True, return_label=False):
                 # reshuffle them and start fresh
                 if consumed[label] + 1 > counts[label]:
                     consumed[label] = 0
-                    np.random.shuffle(shuffled_sequences[label])
+                    rng.shuffle(sequences[offsets[label]:offsets[label + 1]])
 
         previous_label = label
+
+
+def random_label_batches(y, per_label=3, batch_size=32, repeat=True,
+                         return_label=False, root_dir=None, rng=None,
+                         version=None):
+    """Batched (and vectorized) version of `random_label_index`
+
+    Parameters
+    ----------
+    y : iterable
+    per_label : int, optional
+        Defaults to 3.
+    batch_size : int, optional
+        Number of indices yielded at once. Defaults to 32.
+    repeat : bool, optional
+        See `random_label_index`.
+    return_label : bool, optional
+        Default behavior is to only yield arrays of indices. Set to True to
+        yield (indices, labels) tuples of arrays.
+    root_dir : str, optional
+        See `random_label_index`.
+    rng : np.random.Generator or int, optional
+        Random generator (or its seed). Defaults to numpy global random state.
+    version : optional
+        See `random_label_index`.
+
+    Usage
+    -----
+    >>> y = [1, 1, 2, 1, 3, 3, 3, 1, 1, 1, 2, 2, 2, 4, 4, 3, 3, 4]
+    >>> batches = random_label_batches(y, per_label=2, batch_size=4)
+    >>> indices = next(batches)
+    >>> indices
+    array([ 2, 10, 13, 14])
+    """
+
+    rng = get_rng(rng)
+    unique, counts, sequences, offsets = index_labels(
+        y, per_label, root_dir=root_dir, version=version)
+    n_labels = len(unique)
+
+    # consumed[label] keeps track of the number of sequences consumed
+    consumed = np.zeros(n_labels, dtype=np.int64)
+
+    previous_label = None
+    pending, pending_labels, n_pending = [], [], 0
+
+    # infinite loop
+    while True:
+
+        # consume all labels in random order
+        labels = rng.permutation(n_labels)
+
+        # corner case where last label of previous loop
+        # is the same as first label of current loop
+        if labels[0] == previous_label and n_labels > 1:
+            labels = labels[1:]
+        previous_label = labels[-1]
+
+        n = np.full(len(labels), per_label, dtype=np.int64) if repeat \
+            else np.minimum(per_label, counts[labels])
+
+        # labels whose sequences will all be consumed (and reshuffled)
+        done = consumed[labels] + n >= counts[labels]
+
+        # consume 'per_label' sequences from other labels at once
+        # using pre-shuffled order
+        boundaries = np.cumsum(n) - n
+        first = offsets[labels] + consumed[labels]
+        position = np.repeat(first - boundaries, n) + np.arange(np.sum(n))
+        keep = np.repeat(~done, n)
+        indices = np.empty(len(position), dtype=sequences.dtype)
+        indices[keep] = sequences[position[keep]]
+        consumed[labels[~done]] += n[~done]
+
+        # consume the other ones one sequence at a time
+        for label, k, n_k in zip(labels[done], boundaries[done], n[done]):
+            for j in range(n_k):
+                indices[k + j] = sequences[offsets[label] + consumed[label]]
+                consumed[label] += 1
+
+                # if all sequences from current label have been consumed
+                # reshuffle them and start fresh
+                if consumed[label] + 1 > counts[label]:
+                    consumed[label] = 0
+                    rng.shuffle(sequences[offsets[label]:offsets[label + 1]])
+
+        pending.append(indices)
+        pending_labels.append(np.repeat(labels, n))
+        n_pending += len(indices)
+
+        while n_pending >= batch_size:
+            indices = np.hstack(pending)
+            codes = np.hstack(pending_labels)
+            batch, rest = indices[:batch_size], indices[batch_size:]
+            pending, n_pending = [rest], len(rest)
+            pending_labels = [codes[batch_size:]]
+            if return_label:
+                yield batch, unique[codes[:batch_size]]
+            else:
+                yield batch
+
+
+def random_pk_batches(y, n_labels=8, per_label=4, repeat=True,
+                      return_label=False, rng=None):
+    """Yield P x K batches of indices (P distinct labels, K samples each)
+
+    Parameters
+    ----------
+    y : iterable
+    n_labels : int, optional
+        Number P of distinct labels per batch. Defaults to 8.
+    per_label : int, optional
+        Number K of samples per label. Defaults to 4.
+    repeat : bool, optional
+        Default behavior is to repeat sequences for labels that have less than
+        `per_label` different samples. Set to False to never use those labels.
+    return_label : bool, optional
+        Default behavior is to only yield (P, K) arrays of indices. Set to
+        True to yield (indices, labels) tuples where labels is a (P, ) array.
+    rng : np.random.Generator or int, optional
+        Random generator (or its seed). Defaults to numpy global random state.
+
+    Usage
+    -----
+    >>> y = [1, 1, 2, 1, 3, 3, 3, 1, 1, 1, 2, 2, 2, 4, 4, 3, 3, 4]
+    >>> batches = random_pk_batches(y, n_labels=2, per_label=2)
+    >>> next(batches)
+    array([[13, 14],
+           [ 4,  5]])
+
+    Flattened batches can be fed to `batchify`, with batch size P x K:
+    >>> indices = (i for batch in batches for i in batch.ravel())
+
+    See also
+    --------
+    LabelIndex.iter_batches
+    """
+
+    index = LabelIndex(y, per_label=per_label, repeat=repeat, rng=rng)
+    for batch in index.iter_batches(n_labels=n_labels,
+                                    return_label=return_label):
+        yield batch
+
+
+class LabelIndex(object):
+    """Mutable index of sequences by label
+
+    Same as `random_label_index` except that new (index, label) samples
+    (and new labels) can be added at any time, in amortized constant time,
+    without rebuilding the index nor losing the sampling state.
+
+    Parameters
+    ----------
+    y : iterable, optional
+        Initial labels (sample `i` has label `y[i]`). Defaults to an empty
+        index.
+    per_label : int, optional
+        Defaults to 3.
+    repeat : bool, optional
+        See `random_label_index`.
+    weights : {'uniform', 'proportional'}, float or dict, optional
+        Default behavior is to visit every label exactly once per loop. When
+        provided, labels are instead drawn at random (in constant time, using
+        an alias table) with probability proportional to 1 ('uniform'), to
+        their number of samples ('proportional'), to their number of samples
+        to the power `weights` (float temperature), or to user-defined
+        weights (dict mapping labels to their weight, 0 by default).
+    rng : np.random.Generator or int, optional
+        Random generator (or its seed). Defaults to numpy global random state.
+
+    Usage
+    -----
+    >>> index = LabelIndex([1, 1, 2, 1, 3, 3], per_label=2)
+    >>> iterable = index.iter_indices(return_label=True)
+    >>> next(iterable)
+    (2, 2)
+    >>> index.append(6, 4)
+    >>> index.extend([7, 8], [4, 2])
+    """
+
+    def __init__(self, y=None, per_label=3, repeat=True, weights=None,
+                 rng=None):
+        super(LabelIndex, self).__init__()
+        self.per_label = per_label
+        self.repeat = repeat
+        self.rng = get_rng(rng)
+        self.weights = dict(weights) if isinstance(weights, dict) \
+            else weights
+        self.table_ = None
+
+        # labels_[code] is the label with this code
+        self.labels_ = []
+        self.codes_ = {}
+
+        # sequences_[code][:counts_[code]] contains (shuffled) sequences
+        # with this label. first consumed_[code] ones have been consumed.
+        self.sequences_ = []
+        self.counts_ = []
+        self.consumed_ = []
+
+        if y is None or len(y) == 0:
+            return
+
+        unique, counts, sequences, offsets = index_labels(y, per_label)
+        self.labels_ = list(unique)
+        self.codes_ = {label: code for code, label in enumerate(unique)}
+        self.sequences_ = [sequences[offsets[c]:offsets[c + 1]].copy()
+                           for c in range(len(unique))]
+        self.counts_ = [int(count) for count in counts]
+        self.consumed_ = [0] * len(unique)
+
+    @property
+    def n_labels(self):
+        return len(self.labels_)
+
+    def __len__(self):
+        return sum(self.counts_)
+
+    def append(self, index, label):
+        """Add one sample
+
+        The new sample is inserted at a random position among the sequences
+        of `label` that have not been consumed yet.
+
+        Parameters
+        ----------
+        index : int
+            Sample index.
+        label : hashable
+            Sample label (possibly unseen so far).
+        """
+
+        code = self.codes_.get(label)
+        if code is None:
+            code = len(self.labels_)
+            self.codes_[label] = code
+            self.labels_.append(label)
+            self.sequences_.append(np.empty(1, dtype=np.int64))
+            self.counts_.append(0)
+            self.consumed_.append(0)
+
+        # double capacity when full
+        sequences = self.sequences_[code]
+        count = self.counts_[code]
+        if count == len(sequences):
+            sequences = np.resize(sequences, 2 * len(sequences))
+            self.sequences_[code] = sequences
+
+        # swap new sample with a random sequence not yet consumed
+        j = self.rng.integers(self.consumed_[code], count + 1)
+        sequences[count] = sequences[j]
+        sequences[j] = index
+        self.counts_[code] = count + 1
+
+        # labels weights may depend on their number of samples
+        if self.table_ is not None and code < len(self.table_) and \
+           not isinstance(self.weights, dict) and self.weights != 'uniform':
+            self.table_.update([code], [self.get_weight(code)])
+
+    def extend(self, indices, labels):
+        """Add several samples
+
+        Parameters
+        ----------
+        indices : iterable
+            Samples indices.
+        labels : iterable
+            Samples labels.
+        """
+        for index, label in zip(indices, labels):
+            self.append(index, label)
+
+    def consume(self, code, n):
+        """Consume next `n` sequences of label with code `code`
+
+        Sequences are reshuffled once they have all been consumed.
+
+        Returns
+        -------
+        indices : (n, ) np.ndarray
+        """
+
+        sequences = self.sequences_[code]
+        indices = np.empty(n, dtype=np.int64)
+        for k in range(n):
+            indices[k] = sequences[self.consumed_[code]]
+            self.consumed_[code] += 1
+
+            # if all sequences from current label have been consumed
+            # reshuffle them and start fresh
+            if self.consumed_[code] + 1 > self.counts_[code]:
+                self.consumed_[code] = 0
+                self.rng.shuffle(sequences[:self.counts_[code]])
+
+        return indices
+
+    def get_weight(self, code):
+        """Sampling weight of label with code `code` (see `weights`)"""
+        if isinstance(self.weights, dict):
+            return float(self.weights.get(self.labels_[code], 0.))
+        if self.weights == 'uniform':
+            return 1.
+        if self.weights == 'proportional':
+            return float(self.counts_[code])
+        return float(self.counts_[code]) ** self.weights
+
+    def get_table(self):
+        """Get label alias table (extended lazily when labels are added)"""
+        n_labels = self.n_labels
+        if self.table_ is None:
+            self.table_ = AliasTable([self.get_weight(code)
+                                      for code in range(n_labels)])
+        elif len(self.table_) < n_labels:
+            # amortized O(1) per new label (see AliasTable.extend)
+            self.table_.extend([self.get_weight(code)
+                                for code in range(len(self.table_),
+                                                  n_labels)])
+        return self.table_
+
+    def update_weights(self, weights):
+        """Update sampling weights of some labels
+
+        Only the alias table entries of those labels are updated (no full
+        rebuild). Switches to user-defined weights if needed.
+
+        Parameters
+        ----------
+        weights : dict
+            Maps labels to their new sampling weight.
+        """
+
+        if not isinstance(self.weights, dict):
+            self.weights = {self.labels_[code]: self.get_weight(code)
+                            for code in range(self.n_labels)}
+        self.weights.update(weights)
+
+        if self.table_ is None:
+            return
+        codes = [self.codes_[label] for label in weights
+                 if label in self.codes_]
+        self.table_.update(codes, [self.get_weight(c) for c in codes])
+
+    def iter_codes(self):
+        """Yield label codes indefinitely
+
+        Without `weights`, each label is visited once per loop and the same
+        label is never yielded twice in a row (unless there is only one
+        label). Otherwise, labels are drawn independently from the alias
+        table.
+        """
+
+        previous_label = None
+
+        # infinite loop
+        while True:
+
+            n_labels = self.n_labels
+            if n_labels == 0:
+                return
+
+            # draw as many labels as a loop would
+            if self.weights is not None:
+                table = self.get_table()
+                for code in table.draw(size=n_labels, rng=self.rng).tolist():
+                    yield code
+                continue
+
+            # consume all labels in random order
+            for k, code in enumerate(self.rng.choice(n_labels,
+                                                     size=n_labels,
+                                                     replace=False)):
+
+                # corner case where last label of previous loop
+                # is the same as first label of current loop
+                if k == 0 and code == previous_label and n_labels > 1:
+                    continue
+
+                yield code
+
+            previous_label = code
+
+    def iter_indices(self, return_label=False):
+        """Same as `random_label_index`, taking added samples into account
+
+        Labels added while iterating are visited starting from the next
+        loop over labels.
+
+        Parameters
+        ----------
+        return_label : bool, optional
+            Default behavior is to only yield sequence indices. Set to True
+            to yield (indice, label) tuples.
+        """
+
+        for code in self.iter_codes():
+
+            per_this_label = self.per_label if self.repeat \
+                else min(self.per_label, self.counts_[code])
+
+            label = self.labels_[code]
+            for i in self.consume(code, per_this_label).tolist():
+                if return_label:
+                    yield i, label
+                else:
+                    yield i
+
+    def iter_batches(self, n_labels=8, return_label=False):
+        """Yield P x K batches of indices (P labels, K samples per label)
+
+        Labels are visited in random order (each label once per loop) and
+        every batch contains `n_labels` distinct labels, including batches
+        overlapping two loops. `per_label` is used as K.
+
+        Parameters
+        ----------
+        n_labels : int, optional
+            Number P of distinct labels per batch. Defaults to 8.
+        return_label : bool, optional
+            Default behavior is to only yield (P, K) arrays of indices. Set to
+            True to yield (indices, labels) tuples where labels is a (P, )
+            array.
+
+        Raises
+        ------
+        ValueError
+            When there are less than `n_labels` labels eligible (i.e. with at
+            least `per_label` samples, when `repeat` is False).
+        """
+
+        if self.weights is not None:
+            for batch in self._iter_weighted_batches(n_labels, return_label):
+                yield batch
+            return
+
+        queue = []
+
+        # infinite loop
+        while True:
+
+            # labels with too few samples can only be used with repeat
+            eligible = np.arange(self.n_labels)
+            if not self.repeat:
+                counts = np.array(self.counts_, dtype=np.int64)
+                eligible = eligible[counts >= self.per_label]
+            if len(eligible) < n_labels:
+                msg = ('Not enough labels ({n} < {P}) with at least '
+                       '{K} samples.')
+                raise ValueError(msg.format(n=len(eligible), P=n_labels,
+                                            K=self.per_label))
+
+            # complete labels left over from previous loop with labels
+            # from a new loop, making sure they are all distinct
+            loop = list(eligible[self.rng.permutation(len(eligible))])
+            missing = n_labels - len(queue)
+            if queue and missing > 0:
+                left_over = set(queue)
+                first = [c for c in loop if c not in left_over][:missing]
+                picked = set(first)
+                loop = first + [c for c in loop if c not in picked]
+            queue = queue + loop
+
+            while len(queue) >= n_labels:
+                codes, queue = queue[:n_labels], queue[n_labels:]
+                indices = np.vstack([self.consume(code, self.per_label)
+                                     for code in codes])
+                if return_label:
+                    labels = np.array([self.labels_[code] for code in codes])
+                    yield indices, labels
+                else:
+                    yield indices
+
+    def _iter_weighted_batches(self, n_labels, return_label):
+
+        # infinite loop
+        while True:
+
+            # labels with too few samples can only be used with repeat
+            table = self.get_table()
+            eligible = table.weights > 0
+            if not self.repeat:
+                counts = np.array(self.counts_, dtype=np.int64)
+                eligible &= counts >= self.per_label
+            if np.sum(eligible) < n_labels:
+                msg = ('Not enough labels ({n} < {P}) with at least '
+                       '{K} samples and a non-zero weight.')
+                raise ValueError(msg.format(n=np.sum(eligible), P=n_labels,
+                                            K=self.per_label))
+
+            # draw distinct eligible labels
+            codes = []
+            while len(codes) < n_labels:
+                for code in table.draw(size=n_labels, rng=self.rng).tolist():
+                    if eligible[code] and code not in codes:
+                        codes.append(code)
+            codes = codes[:n_labels]
+
+            indices = np.vstack([self.consume(code, self.per_label)
+                                 for code in codes])
+            if return_label:
+                labels = np.array([self.labels_[code] for code in codes])
+                yield indices, labels
+            else:
+                yield indices
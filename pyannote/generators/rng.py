@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+import hashlib
+import threading
+import numpy as np
+
+
+class GlobalRandomState(object):
+    """`np.random.Generator`-like interface to numpy global random state
+
+    This is what samplers use when no random generator is provided, so that
+    seeding with `np.random.seed` keeps working as before.
+    """
+
+    def integers(self, low, high=None, size=None):
+        return np.random.randint(low, high=high, size=size)
+
+    def random(self, size=None):
+        return np.random.random(size=size)
+
+    def permutation(self, x):
+        return np.random.permutation(x)
+
+    def shuffle(self, x):
+        np.random.shuffle(x)
+
+    def choice(self, a, size=None, replace=True, p=None):
+        return np.random.choice(a, size=size, replace=replace, p=p)
+
+
+GLOBAL_RANDOM_STATE = GlobalRandomState()
+
+
+def get_rng(rng=None):
+    """Get random generator
+
+    Parameters
+    ----------
+    rng : np.random.Generator, int, RandomStreams or None, optional
+        Random generator (used as is), seed of a new random generator,
+        random streams (whose default stream is used), or None to use numpy
+        global random state.
+
+    Returns
+    -------
+    rng : np.random.Generator or GlobalRandomState
+    """
+
+    if rng is None:
+        return GLOBAL_RANDOM_STATE
+
+    if isinstance(rng, RandomStreams):
+        return rng.generator
+
+    if isinstance(rng, (int, np.integer, np.random.SeedSequence)):
+        return np.random.default_rng(rng)
+
+    return rng
+
+
+def check_rng(rng=None):
+    """Check `rng` parameter of fragment generators
+
+    Seeds are turned into `RandomStreams`, so that generators draw from one
+    dedicated stream per file. Other values are returned as is.
+    """
+    if isinstance(rng, (int, np.integer, np.random.SeedSequence)):
+        return RandomStreams(seed=rng)
+    return rng
+
+
+def file_rng(rng, current_file):
+    """Get random generator dedicated to `current_file`
+
+    Same as `get_rng` except that `RandomStreams` provide a dedicated
+    stream for each file (see `RandomStreams.file`).
+    """
+    if isinstance(rng, RandomStreams):
+        return rng.file(current_file)
+    return get_rng(rng)
+
+
+def stable_hash(key):
+    """Map integers (as is) and strings (hashed) to non-negative integers"""
+    if isinstance(key, (int, np.integer)):
+        return int(key)
+    digest = hashlib.sha256(str(key).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'little')
+
+
+class RandomStreams(object):
+    """Independent and reproducible random streams
+
+    Streams are derived from a root seed with `np.random.SeedSequence`, using
+    keys (e.g. worker, epoch, file) rather than an order of creation. Hence,
+    as long as random numbers are drawn from the stream dedicated to a file,
+    results do not depend on the number of workers nor on which worker
+    processes which file.
+
+    Parameters
+    ----------
+    seed : int, optional
+        Root seed. Defaults to fresh entropy from the operating system.
+
+    Usage
+    -----
+    >>> streams = RandomStreams(seed=42)
+    >>> rng = streams.derive('epoch', 3)
+    >>> generator = RandomSegments(duration=3., rng=streams)
+    """
+
+    def __init__(self, seed=None):
+        super(RandomStreams, self).__init__()
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.seed = self.seed_sequence.entropy
+        self.generator = self.derive('default')
+        self.visits_ = {}
+        self.lock_ = threading.Lock()
+
+    def __getstate__(self):
+        # locks cannot be pickled (e.g. to be sent to worker processes)
+        state = dict(self.__dict__)
+        del state['lock_']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock_ = threading.Lock()
+
+    def derive(self, *keys):
+        """Get random generator dedicated to `keys`
+
+        Parameters
+        ----------
+        keys : int or str
+            Any combination of keys.
+
+        Returns
+        -------
+        rng : np.random.Generator
+            Always the same stream for the same keys (and root seed).
+        """
+        seed_sequence = np.random.SeedSequence(
+            self.seed, spawn_key=tuple(stable_hash(key) for key in keys))
+        return np.random.default_rng(seed_sequence)
+
+    def worker(self, worker_id):
+        """Stream dedicated to `worker_id`th worker"""
+        return self.derive('worker', worker_id)
+
+    def epoch(self, epoch):
+        """Stream dedicated to `epoch`th epoch"""
+        return self.derive('epoch', epoch)
+
+    def file(self, current_file, epoch=None):
+        """Stream dedicated to `current_file` (and `epoch`)
+
+        Parameters
+        ----------
+        current_file : dict
+        epoch : int, optional
+            Defaults to the number of times this method has already been
+            called for this file (i.e. a new stream at every visit).
+        """
+        from pyannote.database.util import get_unique_identifier
+        uri = get_unique_identifier(current_file)
+        if epoch is None:
+            with self.lock_:
+                epoch = self.visits_.get(uri, 0)
+                self.visits_[uri] = epoch + 1
+        return self.derive('file', uri, epoch)
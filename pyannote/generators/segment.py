@@ -0,0 +1,588 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+import numpy as np
+from .rng import get_rng
+
+
+class SegmentArray(object):
+    """Compact, array-backed sequence of (optionally labeled) segments
+
+    Segments are stored as two float arrays (start and end times) and,
+    optionally, an integer array of label codes indexing a label vocabulary.
+    `Segment` instances are only created on demand, when indexing or
+    iterating.
+
+    Parameters
+    ----------
+    start, end : (n_segments, ) array-like
+        Start and end times, in seconds.
+    label : (n_segments, ) array-like, optional
+        Label codes, i.e. index of each segment label in `vocabulary`.
+        Use -1 for segments labeled as None. Defaults to unlabeled segments.
+    vocabulary : list, optional
+        List of labels. Required when `label` is provided.
+
+    Usage
+    -----
+    >>> segments = SegmentArray([0., 1.], [2., 3.])
+    >>> for segment in segments:
+    ...     print(segment)
+    >>> labeled = SegmentArray([0., 1.], [2., 3.], label=[0, 1],
+    ...                        vocabulary=['A', 'B'])
+    >>> for segment, label in labeled:
+    ...     print(segment, label)
+    """
+
+    def __init__(self, start, end, label=None, vocabulary=None):
+        super(SegmentArray, self).__init__()
+
+        self.start = np.asarray(start, dtype=np.float64).reshape(-1)
+        self.end = np.asarray(end, dtype=np.float64).reshape(-1)
+        if len(self.start) != len(self.end):
+            raise ValueError(
+                '"start" and "end" must have the same number of elements.')
+
+        if label is None:
+            self.label = None
+            self.vocabulary = None
+            return
+
+        if vocabulary is None:
+            raise ValueError(
+                '"vocabulary" must be provided along with "label".')
+        self.label = np.asarray(label, dtype=np.int32).reshape(-1)
+        if len(self.label) != len(self.start):
+            raise ValueError(
+                '"label" and "start" must have the same number of elements.')
+        self.vocabulary = list(vocabulary)
+
+    @classmethod
+    def empty(cls, labeled=False):
+        """Empty segment array"""
+        if labeled:
+            return cls([], [], label=[], vocabulary=[])
+        return cls([], [])
+
+    @classmethod
+    def from_segments(cls, segments, labeled=False):
+        """Build segment array out of an iterable of segments
+
+        Parameters
+        ----------
+        segments : iterable
+            Iterable of `Segment` instances, or of (`Segment`, label) tuples
+            when `labeled` is True.
+        labeled : bool, optional
+            Defaults to unlabeled segments.
+        """
+
+        if not labeled:
+            start, end = [], []
+            for segment in segments:
+                start.append(segment.start)
+                end.append(segment.end)
+            return cls(start, end)
+
+        start, end, labels = [], [], []
+        for segment, label in segments:
+            start.append(segment.start)
+            end.append(segment.end)
+            labels.append(label)
+        label, vocabulary = encode_labels(labels)
+        return cls(start, end, label=label, vocabulary=vocabulary)
+
+    @classmethod
+    def concatenate(cls, arrays):
+        """Concatenate segment arrays
+
+        Label vocabularies are merged (in order of first appearance) and
+        label codes updated accordingly.
+        """
+
+        arrays = list(arrays)
+        if not arrays:
+            return cls.empty()
+
+        start = np.hstack([a.start for a in arrays])
+        end = np.hstack([a.end for a in arrays])
+
+        labeled = [a.labeled for a in arrays]
+        if not any(labeled):
+            return cls(start, end)
+        if not all(labeled):
+            raise ValueError(
+                'Cannot concatenate labeled and unlabeled segment arrays.')
+
+        vocabulary, mapping = [], {}
+        codes = []
+        for a in arrays:
+            # lookup[c] is the new code of old code c (and lookup[-1] = -1)
+            lookup = np.empty(len(a.vocabulary) + 1, dtype=np.int32)
+            lookup[-1] = -1
+            for c, label in enumerate(a.vocabulary):
+                if label not in mapping:
+                    mapping[label] = len(vocabulary)
+                    vocabulary.append(label)
+                lookup[c] = mapping[label]
+            codes.append(lookup[a.label])
+
+        return cls(start, end, label=np.hstack(codes), vocabulary=vocabulary)
+
+    @property
+    def labeled(self):
+        """Whether segments are labeled"""
+        return self.label is not None
+
+    @property
+    def duration(self):
+        """(n_segments, ) array of segment durations"""
+        return self.end - self.start
+
+    def get_label(self, i):
+        """Label of `i`th segment (None if unlabeled)"""
+        if not self.labeled:
+            return None
+        code = self.label[i]
+        return None if code < 0 else self.vocabulary[code]
+
+    def get_labels(self):
+        """List of segment labels"""
+        if not self.labeled:
+            return [None] * len(self)
+        lookup = self.vocabulary + [None]
+        return [lookup[code] for code in self.label]
+
+    def to_frames(self, frames, mode='center', fixed=None):
+        """Convert segments to frame ranges
+
+        This is the vectorized equivalent of calling `frames.crop(segment,
+        mode=mode, fixed=fixed, return_ranges=True)` for every segment.
+
+        Parameters
+        ----------
+        frames : SlidingWindow
+            Feature sliding window.
+        mode : {'center', 'strict', 'loose'}, optional
+            See `SlidingWindow.crop`. Defaults to 'center'.
+        fixed : float, optional
+            Overrides segments duration and ensures that the number of
+            frames is the same for all segments. Only used in 'center' mode.
+
+        Returns
+        -------
+        start_frame : (n_segments, ) np.ndarray
+            Index of first frame of each segment.
+        n_frames : (n_segments, ) np.ndarray
+            Number of frames of each segment.
+        """
+
+        if mode == 'center':
+            offset = frames.start + .5 * frames.duration
+            i = np.rint((self.start - offset) / frames.step)
+            if fixed is None:
+                j = np.rint((self.end - offset) / frames.step)
+                n = j - i + 1
+            else:
+                n = np.full(len(i), np.rint(fixed / frames.step))
+
+        elif mode == 'strict':
+            i = np.ceil((self.start - frames.start) / frames.step)
+            j = np.floor((self.end - frames.duration - frames.start) /
+                         frames.step)
+            n = j - i + 1
+
+        elif mode == 'loose':
+            i = np.ceil((self.start - frames.duration - frames.start) /
+                        frames.step)
+            j = np.floor((self.end - frames.start) / frames.step)
+            n = j - i + 1
+
+        else:
+            msg = "'mode' must be one of {'loose', 'strict', 'center'}."
+            raise ValueError(msg)
+
+        return i.astype(np.int64), n.astype(np.int64)
+
+    def snap(self, frames):
+        """Snap segments start time to the feature frame grid
+
+        Each segment is shifted (by at most half a frame step) so that its
+        start time matches the center of its closest frame. Durations are
+        left unchanged, so that segments with the same duration end up with
+        the same number of frames.
+
+        Parameters
+        ----------
+        frames : SlidingWindow
+            Feature sliding window.
+
+        Returns
+        -------
+        snapped : SegmentArray
+        """
+        start_frame, _ = self.to_frames(frames, mode='center', fixed=0.)
+        start = frames.start + .5 * frames.duration + \
+            start_frame * frames.step
+        end = start + self.duration
+        if self.labeled:
+            return self.__class__(start, end, label=self.label,
+                                  vocabulary=self.vocabulary)
+        return self.__class__(start, end)
+
+    def __len__(self):
+        return len(self.start)
+
+    def __getitem__(self, key):
+        """Segment (or (segment, label) tuple) at given position
+
+        Indexing with a slice, a boolean mask or an array of positions
+        returns a new `SegmentArray` sharing the same vocabulary.
+        """
+
+        if isinstance(key, (int, np.integer)):
+            from pyannote.core import Segment
+            segment = Segment(start=float(self.start[key]),
+                              end=float(self.end[key]))
+            if self.labeled:
+                return segment, self.get_label(key)
+            return segment
+
+        if self.labeled:
+            return self.__class__(self.start[key], self.end[key],
+                                  label=self.label[key],
+                                  vocabulary=self.vocabulary)
+        return self.__class__(self.start[key], self.end[key])
+
+    def __iter__(self):
+        from pyannote.core import Segment
+        start = self.start.tolist()
+        end = self.end.tolist()
+
+        if not self.labeled:
+            for s, e in zip(start, end):
+                yield Segment(start=s, end=e)
+            return
+
+        lookup = self.vocabulary + [None]
+        for s, e, code in zip(start, end, self.label.tolist()):
+            yield Segment(start=s, end=e), lookup[code]
+
+    def __repr__(self):
+        labeled = ', labeled' if self.labeled else ''
+        return f'<SegmentArray: {len(self)} segments{labeled}>'
+
+
+def encode_labels(labels, vocabulary=None):
+    """Encode labels as integer codes
+
+    Parameters
+    ----------
+    labels : iterable
+        Labels. None is encoded as -1.
+    vocabulary : list, optional
+        Known labels. Unknown labels are appended to it (in order of first
+        appearance). Defaults to an empty vocabulary.
+
+    Returns
+    -------
+    codes : (n_labels, ) np.ndarray
+    vocabulary : list
+    """
+
+    vocabulary = [] if vocabulary is None else list(vocabulary)
+    mapping = {label: c for c, label in enumerate(vocabulary)}
+
+    codes = []
+    for label in labels:
+        if label is None:
+            codes.append(-1)
+            continue
+        code = mapping.get(label)
+        if code is None:
+            code = mapping[label] = len(vocabulary)
+            vocabulary.append(label)
+        codes.append(code)
+
+    return np.array(codes, dtype=np.int32), vocabulary
+
+
+class TrackIndex(object):
+    """Flat index of the tracks of an annotation
+
+    Built in one pass over the annotation, it allows to draw random tracks
+    (possibly constrained by label) in constant time, without ever copying
+    the annotation.
+
+    Parameters
+    ----------
+    annotation : Annotation
+    min_duration : float, optional
+        When provided, skip tracks shorter than `min_duration`.
+
+    Attributes
+    ----------
+    start, end : (n_tracks, ) np.ndarray
+        Tracks start and end times, in chronological order.
+    track : (n_tracks, ) np.ndarray
+        Tracks names.
+    label : (n_tracks, ) np.ndarray
+        Tracks label codes (i.e. index in `vocabulary`).
+    vocabulary : list
+        Sorted list of labels (as returned by `annotation.labels()`).
+    segment_offsets : (n_segments + 1, ) np.ndarray
+        Tracks of `i`th unique segment are tracks
+        segment_offsets[i] to segment_offsets[i + 1] (excluded).
+    by_label : (n_tracks, ) np.ndarray
+        Tracks sorted by label, then in chronological order.
+    group_offsets : (n_groups + 1, ) np.ndarray
+        Tracks of `g`th (label, segment) group are tracks
+        by_label[group_offsets[g]:group_offsets[g + 1]].
+    label_offsets : (n_labels + 1, ) np.ndarray
+        Groups of `l`th label are groups
+        label_offsets[l] to label_offsets[l + 1] (excluded).
+    """
+
+    def __init__(self, annotation, min_duration=None):
+        super(TrackIndex, self).__init__()
+
+        start, end, track, label, segment = [], [], [], [], []
+        previous, s = None, -1
+        for segment_, track_, label_ in annotation.itertracks(label=True):
+            if min_duration is not None and segment_.duration < min_duration:
+                continue
+            if segment_ != previous:
+                previous, s = segment_, s + 1
+            start.append(segment_.start)
+            end.append(segment_.end)
+            track.append(track_)
+            label.append(label_)
+            segment.append(s)
+
+        # same order as annotation.labels()
+        self.vocabulary = sorted(set(label), key=str)
+        mapping = {label_: c for c, label_ in enumerate(self.vocabulary)}
+
+        self.start = np.array(start, dtype=np.float64)
+        self.end = np.array(end, dtype=np.float64)
+        self.track = np.empty(len(track), dtype=object)
+        self.track[:] = track
+        self.label = np.array([mapping[label_] for label_ in label],
+                              dtype=np.int32)
+        self.segment = np.array(segment, dtype=np.int64)
+
+        n_segments = s + 1
+        n_labels = len(self.vocabulary)
+
+        # tracks are already grouped by segment
+        counts = np.bincount(self.segment, minlength=n_segments)
+        self.segment_offsets = np.hstack([[0], np.cumsum(counts)])
+
+        # sort tracks by label (then chronologically)
+        self.by_label = np.lexsort((self.segment, self.label))
+        label = self.label[self.by_label]
+        segment = self.segment[self.by_label]
+        new_group = np.ones(len(label), dtype=bool)
+        new_group[1:] = (label[1:] != label[:-1]) | \
+                        (segment[1:] != segment[:-1])
+        first = np.where(new_group)[0]
+        self.group_offsets = np.hstack([first, [len(label)]])
+        counts = np.bincount(label[first], minlength=n_labels)
+        self.label_offsets = np.hstack([[0], np.cumsum(counts)])
+
+        # segment_label_[i] is the label code of `i`th unique segment if all
+        # its tracks share the same label, and -1 otherwise
+        single = (np.diff(self.group_offsets) ==
+                  np.diff(self.segment_offsets)[segment[first]])
+        self.segment_label_ = np.full(n_segments, -1, dtype=np.int32)
+        self.segment_label_[segment[first][single]] = label[first][single]
+
+    def __len__(self):
+        return len(self.start)
+
+    @property
+    def n_segments(self):
+        return len(self.segment_offsets) - 1
+
+    def get_segment(self, i):
+        """Segment of `i`th track"""
+        from pyannote.core import Segment
+        return Segment(start=float(self.start[i]), end=float(self.end[i]))
+
+    def get_label(self, i):
+        """Label of `i`th track"""
+        return self.vocabulary[self.label[i]]
+
+    def get_segments(self, indices):
+        """Segments (and labels) of tracks as a `SegmentArray`"""
+        return SegmentArray(self.start[indices], self.end[indices],
+                            label=self.label[indices],
+                            vocabulary=self.vocabulary)
+
+    def _draw_within(self, segment, rng):
+        """Draw one random track within each of `segment`"""
+        first = self.segment_offsets[segment]
+        count = self.segment_offsets[segment + 1] - first
+        return first + (rng.random(len(segment)) * count).astype(np.int64)
+
+    def draw(self, size, rng=None):
+        """Draw random tracks
+
+        Unique segments are drawn uniformly at random, then one of their
+        tracks is drawn uniformly at random.
+
+        Parameters
+        ----------
+        size : int
+            Number of tracks.
+        rng : np.random.Generator, optional
+            Random generator. Defaults to numpy global random state.
+
+        Returns
+        -------
+        tracks : (size, ) np.ndarray
+            Tracks indices.
+        """
+        rng = get_rng(rng)
+        segment = rng.integers(self.n_segments, size=size)
+        return self._draw_within(segment, rng)
+
+    def draw_label(self, label, size=None, rng=None):
+        """Draw random tracks with a given label
+
+        Unique segments with this label are drawn uniformly at random, then
+        one of their tracks with this label is drawn uniformly at random.
+
+        Parameters
+        ----------
+        label : int or (size, ) np.ndarray
+            Label code (or one label code per draw).
+        size : int, optional
+            Number of tracks. Required when `label` is an int.
+        rng : np.random.Generator, optional
+            Random generator. Defaults to numpy global random state.
+
+        Returns
+        -------
+        tracks : (size, ) np.ndarray
+            Tracks indices.
+        """
+        rng = get_rng(rng)
+        label = self._broadcast(label, size)
+        size = len(label)
+        first = self.label_offsets[label]
+        n_groups = self.label_offsets[label + 1] - first
+        group = first + (rng.random(size) * n_groups).astype(np.int64)
+        first = self.group_offsets[group]
+        count = self.group_offsets[group + 1] - first
+        i = first + (rng.random(size) * count).astype(np.int64)
+        return self.by_label[i]
+
+    def has_other(self, label):
+        """Whether at least one track is not labeled `label`"""
+        return np.any(self.segment_label_ != label)
+
+    def draw_other(self, label, size=None, rng=None):
+        """Draw random tracks whose label is not the given one
+
+        Unique segments with at least one track not labeled `label` are drawn
+        uniformly at random, then one of their tracks not labeled `label` is
+        drawn uniformly at random (using rejection sampling).
+
+        Parameters
+        ----------
+        label : int or (size, ) np.ndarray
+            Label code (or one label code per draw).
+        size : int, optional
+            Number of tracks. Required when `label` is an int.
+        rng : np.random.Generator, optional
+            Random generator. Defaults to numpy global random state.
+
+        Returns
+        -------
+        tracks : (size, ) np.ndarray
+            Tracks indices.
+        """
+
+        rng = get_rng(rng)
+        label = self._broadcast(label, size)
+        size = len(label)
+
+        if not all(self.has_other(l) for l in np.unique(label)):
+            raise ValueError('All tracks share the same label.')
+
+        # draw unique segments, rejecting those only labeled `label`
+        segment = rng.integers(self.n_segments, size=size)
+        redraw = np.where(self.segment_label_[segment] == label)[0]
+        while len(redraw):
+            segment[redraw] = rng.integers(self.n_segments, size=len(redraw))
+            redraw = redraw[
+                self.segment_label_[segment[redraw]] == label[redraw]]
+
+        # draw tracks within those segments, rejecting those labeled `label`
+        tracks = self._draw_within(segment, rng)
+        redraw = np.where(self.label[tracks] == label)[0]
+        while len(redraw):
+            tracks[redraw] = self._draw_within(segment[redraw], rng)
+            redraw = redraw[self.label[tracks[redraw]] == label[redraw]]
+
+        return tracks
+
+    def draw_triplets(self, per_label, rng=None):
+        """Draw random (anchor, positive, negative) track triplets
+
+        Labels are visited in vocabulary order, and `per_label` consecutive
+        triplets are drawn for each of them: anchor and positive tracks share
+        this label, negative track does not. Labels without any negative
+        track are skipped.
+
+        Parameters
+        ----------
+        per_label : int
+            Number of triplets per label.
+        rng : np.random.Generator, optional
+            Random generator. Defaults to numpy global random state.
+
+        Returns
+        -------
+        anchor, positive, negative : (n_triplets, ) np.ndarray
+            Tracks indices.
+        """
+        labels = [l for l in range(len(self.vocabulary)) if self.has_other(l)]
+        label = np.repeat(np.array(labels, dtype=np.int64), per_label)
+        rng = get_rng(rng)
+        positives = self.draw_label(np.repeat(label, 2), rng=rng)
+        negatives = self.draw_other(label, rng=rng)
+        return positives[::2], positives[1::2], negatives
+
+    def _broadcast(self, label, size):
+        label = np.asarray(label, dtype=np.int64)
+        if label.ndim == 0:
+            label = np.full(size, label, dtype=np.int64)
+        return label
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import os
+import json
+import time
+import weakref
+import threading
+import numpy as np
+
+
+class PipelineStats(object):
+    """Data pipeline counters
+
+    Counters are stored in one dictionary per thread, so that incrementing
+    them does not require any lock: the hot path only ever writes to its
+    own dictionary, and `snapshot` sums them all.
+
+    Counters incremented by batch generators are:
+        - 'items', 'batches': number of packed items and batches,
+        - 'files': number of preprocessed files,
+        - 'failures': number of files for which preprocessing failed (and
+          that were skipped because `robust` was set to True),
+        - 'bytes_put', 'bytes_got': size of numpy arrays put into (and got
+          from) background generator queues.
+    """
+
+    def __init__(self):
+        super(PipelineStats, self).__init__()
+        self.local_ = threading.local()
+        self.counts_ = []
+        self.lock_ = threading.Lock()
+
+    def count(self, name, n=1):
+        """Increment `name` counter by `n`"""
+        try:
+            counts = self.local_.counts
+        except AttributeError:
+            counts = self.local_.counts = {}
+            with self.lock_:
+                self.counts_.append(counts)
+        counts[name] = counts.get(name, 0) + n
+
+    def snapshot(self):
+        """Current value of all counters (and queue fill ratio)"""
+
+        total = {'items': 0, 'batches': 0, 'files': 0, 'failures': 0,
+                 'bytes_put': 0, 'bytes_got': 0}
+        with self.lock_:
+            counts = list(self.counts_)
+        with _queues_lock:
+            queues = list(_queues)
+
+        for c in counts:
+            for name, n in c.copy().items():
+                total[name] = total.get(name, 0) + n
+        # bytes put before reporting started may be got afterwards
+        total['bytes_in_flight'] = max(
+            0, total['bytes_put'] - total['bytes_got'])
+
+        fill = [q.qsize() / q.maxsize for q in queues if q.maxsize > 0]
+        total['queue_fill'] = float(np.mean(fill)) if fill else 0.
+        return total
+
+
+class StatsReporter(threading.Thread):
+    """Periodically write data pipeline statistics to a file
+
+    Parameters
+    ----------
+    stats : PipelineStats
+    path : str
+        Path to output file. It is overwritten at every report.
+    interval : float, optional
+        Number of seconds between two reports. Defaults to 10s.
+    format : {'json', 'text', 'prometheus'}, optional
+        Write statistics as a JSON object (default), as "name value" lines,
+        or in Prometheus text exposition format (e.g. to be collected by
+        the node exporter textfile collector), where counters are named
+        with a "_total" suffix.
+    """
+
+    RATES = ['items', 'batches', 'files']
+    COUNTERS = ['items', 'batches', 'files', 'failures',
+                'bytes_put', 'bytes_got']
+
+    def __init__(self, stats, path, interval=10., format='json'):
+        super(StatsReporter, self).__init__(daemon=True)
+
+        if format not in ('json', 'text', 'prometheus'):
+            msg = 'format must be one of "json", "text", or "prometheus".'
+            raise ValueError(msg)
+
+        self.stats = stats
+        self.path = path
+        self.interval = interval
+        self.format = format
+
+        self.stop_ = threading.Event()
+        self.t0_ = time.time()
+        self.last_ = (self.t0_, stats.snapshot())
+
+    def run(self):
+        while not self.stop_.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        """Stop reporting (after writing one final report)"""
+        self.stop_.set()
+        if self.is_alive():
+            self.join()
+        self.report()
+
+    def report(self):
+        """Write current statistics to `path`"""
+
+        t = time.time()
+        snapshot = self.stats.snapshot()
+
+        previous_t, previous = self.last_
+        elapsed = max(t - previous_t, 1e-6)
+        for name in self.RATES:
+            rate = (snapshot[name] - previous[name]) / elapsed
+            snapshot[name + '_per_second'] = rate
+        self.last_ = (t, snapshot)
+
+        snapshot['uptime'] = t - self.t0_
+        snapshot['timestamp'] = t
+
+        if self.format == 'json':
+            content = json.dumps(snapshot, sort_keys=True)
+
+        elif self.format == 'text':
+            content = '\n'.join('{0} {1}'.format(name, value)
+                                for name, value in sorted(snapshot.items()))
+
+        elif self.format == 'prometheus':
+            lines = []
+            for name, value in sorted(snapshot.items()):
+                metric = 'pyannote_generators_' + name
+                kind = 'gauge'
+                if name in self.COUNTERS:
+                    metric, kind = metric + '_total', 'counter'
+                lines.append('# TYPE {0} {1}'.format(metric, kind))
+                lines.append('{0} {1}'.format(metric, value))
+            content = '\n'.join(lines)
+
+        # write to a temporary file first so that readers never see a
+        # partially written report
+        tmp = '{path}.{pid}.tmp'.format(path=self.path, pid=os.getpid())
+        with open(tmp, 'w') as fp:
+            fp.write(content + '\n')
+        os.replace(tmp, self.path)
+
+
+def nbytes(item):
+    """Total size of numpy arrays contained in (nested) `item`"""
+
+    if isinstance(item, np.ndarray):
+        return item.nbytes
+
+    if isinstance(item, (list, tuple)):
+        return sum(nbytes(i) for i in item)
+
+    if isinstance(item, dict):
+        return sum(nbytes(i) for i in item.values())
+
+    return 0
+
+
+# current statistics (None when reporting is off)
+_stats = None
+_reporter = None
+
+# background generator queues whose fill ratio is reported
+_queues = weakref.WeakSet()
+_queues_lock = threading.Lock()
+
+
+def add_queue(queue):
+    """Report fill ratio of `queue` (a bounded queue.Queue)"""
+    with _queues_lock:
+        _queues.add(queue)
+
+
+def start_reporting(path, interval=10., format='json'):
+    """Start collecting and periodically reporting pipeline statistics
+
+    Parameters
+    ----------
+    path : str
+    interval : float, optional
+    format : {'json', 'text', 'prometheus'}, optional
+        See `StatsReporter`.
+
+    Returns
+    -------
+    reporter : StatsReporter
+
+    Usage
+    -----
+    >>> start_reporting('stats.json', interval=60.)
+    >>> for batch in batch_generator.from_files(protocol.train(),
+    ...                                         infinite=True):
+    ...     do_something(batch)
+    """
+    global _stats, _reporter
+    stop_reporting()
+    stats = PipelineStats()
+    _reporter = StatsReporter(stats, path, interval=interval, format=format)
+    _stats = stats
+    _reporter.start()
+    return _reporter
+
+
+def stop_reporting():
+    """Stop collecting and reporting pipeline statistics
+
+    Returns
+    -------
+    stats : PipelineStats
+        Statistics that were collected (or None if reporting was off).
+    """
+    global _stats, _reporter
+    stats, reporter = _stats, _reporter
+    _stats, _reporter = None, None
+    if reporter is not None:
+        reporter.stop()
+    return stats
+
+
+def get_stats():
+    """Current statistics (None when reporting is off)"""
+    return _stats
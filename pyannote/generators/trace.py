@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import os
+import json
+import time
+import threading
+
+
+class Tracer(object):
+    """Record data pipeline spans in Chrome trace-event format
+
+    Spans (e.g. file preprocessing, batch packing, queue waits) are stored
+    as "complete" trace events, with the thread that produced them, and can
+    be saved as a JSON file to be inspected in a timeline viewer (e.g.
+    chrome://tracing or https://ui.perfetto.dev).
+
+    Recording a span boils down to appending to a list, which is atomic
+    and therefore does not require any lock.
+
+    Parameters
+    ----------
+    max_events : int, optional
+        Stop recording once that many spans have been recorded.
+        Defaults to record all spans.
+
+    Usage
+    -----
+    >>> tracer = start_tracing()
+    >>> for batch in batch_generator.from_files(protocol.train()):
+    ...     do_something(batch)
+    >>> stop_tracing('trace.json')
+    """
+
+    def __init__(self, max_events=None):
+        super(Tracer, self).__init__()
+        self.max_events = max_events
+        self.events_ = []
+        self.threads_ = {}
+        self.pid_ = os.getpid()
+        self.t0_ = time.perf_counter()
+
+    def add(self, name, start, end, cat='generators', args=None):
+        """Record span
+
+        Parameters
+        ----------
+        name : str
+            Span name.
+        start, end : float
+            Span boundaries, as returned by `time.perf_counter`.
+        cat : str, optional
+            Span category.
+        args : dict, optional
+            Additional information displayed along with the span.
+        """
+
+        if self.max_events is not None and \
+           len(self.events_) >= self.max_events:
+            return
+
+        tid = threading.get_ident()
+        if tid not in self.threads_:
+            self.threads_[tid] = threading.current_thread().name
+
+        event = {'name': name, 'cat': cat, 'ph': 'X',
+                 'ts': 1e6 * (start - self.t0_), 'dur': 1e6 * (end - start),
+                 'pid': self.pid_, 'tid': tid}
+        if args:
+            event['args'] = args
+        self.events_.append(event)
+
+    def span(self, name, cat='generators', **args):
+        """Context manager recording the span of its body"""
+        return Span(self, name, cat, args)
+
+    def get_events(self):
+        """Trace events (including thread names metadata)"""
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid_,
+                   'tid': tid, 'args': {'name': name}}
+                  for tid, name in list(self.threads_.items())]
+        return events + list(self.events_)
+
+    def save(self, path):
+        """Save trace as Chrome trace-event JSON file"""
+        with open(path, 'w') as fp:
+            json.dump({'traceEvents': self.get_events(),
+                       'displayTimeUnit': 'ms'}, fp)
+
+    def clear(self):
+        self.events_ = []
+
+    def __len__(self):
+        return len(self.events_)
+
+
+class Span(object):
+    """Span recorded by a `Tracer` (see `Tracer.span`)"""
+
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.add(self.name, self.start, time.perf_counter(),
+                        cat=self.cat, args=self.args)
+        return False
+
+
+class NullSpan(object):
+    """Span that does nothing (used when tracing is off)"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+# current tracer (None when tracing is off)
+_tracer = None
+
+
+def start_tracing(max_events=None):
+    """Start recording data pipeline spans
+
+    Parameters
+    ----------
+    max_events : int, optional
+        See `Tracer`.
+
+    Returns
+    -------
+    tracer : Tracer
+    """
+    global _tracer
+    _tracer = Tracer(max_events=max_events)
+    return _tracer
+
+
+def stop_tracing(path=None):
+    """Stop recording data pipeline spans
+
+    Parameters
+    ----------
+    path : str, optional
+        When provided, save trace to this file.
+
+    Returns
+    -------
+    tracer : Tracer
+        Tracer that was used (or None if tracing was off).
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None and path is not None:
+        tracer.save(path)
+    return tracer
+
+
+def get_tracer():
+    """Current tracer (None when tracing is off)"""
+    return _tracer
+
+
+def span(name, cat='generators', **args):
+    """Context manager recording the span of its body in current tracer
+
+    Does nothing when tracing is off.
+
+    Usage
+    -----
+    >>> with span('preprocess', uri=uri):
+    ...     preprocessed_file = preprocess(current_file)
+    """
+    if _tracer is None:
+        return NULL_SPAN
+    return Span(_tracer, name, cat, args)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import numpy as np
+from pyannote.generators.alias import AliasTable
+from pyannote.generators.indices import LabelIndex
+
+
+def test_extend():
+    """Appended weights are drawn with the right probability"""
+
+    rng = np.random.default_rng(0)
+    weights = [1., 2.]
+    table = AliasTable(weights)
+    for _ in range(500):
+        weight = float(rng.integers(1, 5))
+        table.extend([weight])
+        weights.append(weight)
+    np.testing.assert_array_equal(table.weights, weights)
+
+    n_draws = 500000
+    frequency = np.bincount(table.draw(size=n_draws, rng=rng),
+                            minlength=len(weights)) / n_draws
+    expected = np.array(weights) / np.sum(weights)
+    assert np.max(np.abs(frequency - expected)) < 1e-3
+
+
+def test_extend_amortized(monkeypatch):
+    """Adding labels one at a time does not rebuild the table every time"""
+
+    n_builds = [0]
+    build = AliasTable.build
+
+    def counting_build(self, *args, **kwargs):
+        n_builds[0] += 1
+        return build(self, *args, **kwargs)
+
+    monkeypatch.setattr(AliasTable, 'build', counting_build)
+
+    index = LabelIndex(weights='uniform', rng=0)
+    for label in range(2000):
+        index.append(label, label)
+        index.get_table().draw(rng=index.rng)
+
+    assert index.n_labels == 2000
+    assert n_builds[0] < 30
+
+
+def test_update_repeated_indices():
+    """Repeated indices are applied once, last write wins"""
+
+    table = AliasTable([1., 1., 1.])
+    table.update([0, 0], [5., 3.])
+    np.testing.assert_array_equal(table.weights, [3., 1., 1.])
+    assert table.total == 5.
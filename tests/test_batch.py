@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import os
+import sys
+import signal
+import json
+import subprocess
+import pytest
+from pyannote.generators.batch import FileBasedBatchGenerator
+from pyannote.generators.fragment import SlidingSegments
+from pyannote.generators.duration import DurationIndex
+from pyannote.generators.stats import start_reporting, stop_reporting
+
+
+class Fragments(object):
+    def from_file(self, current_file):
+        for i in range(current_file['n']):
+            yield current_file['uri'], i
+
+
+def process(item, current_file=None):
+    """Tag item with the process it was processed in"""
+    return item, os.getpid()
+
+
+class Batches(FileBasedBatchGenerator):
+    def preprocess(self, current_file, **kwargs):
+        if current_file['uri'] == 'kill':
+            os.kill(os.getpid(), signal.SIGKILL)
+        return current_file
+
+
+FILES = [{'uri': 'file{i}'.format(i=i), 'n': 7 + 5 * i} for i in range(9)]
+
+
+@pytest.mark.parametrize('n_workers', [1, 3])
+@pytest.mark.parametrize('incomplete', [False, True])
+def test_parallel(n_workers, incomplete):
+    batches = Batches(Fragments(), {'@': (process, None)}, batch_size=16)
+    expected = [item for batch in batches.from_files(FILES, incomplete=True)
+                for item, _ in batch]
+
+    parallel = list(batches.from_files(FILES, incomplete=incomplete,
+                                       n_workers=n_workers))
+    items = [item for batch in parallel for item, _ in batch]
+    sizes = [len(batch) for batch in parallel]
+
+    if incomplete:
+        assert sorted(items) == sorted(expected)
+        assert sizes[:-1] == [16] * (len(sizes) - 1)
+    else:
+        assert set(items) <= set(expected)
+        assert sizes == [16] * (len(expected) // 16)
+
+    # items left by workers are processed by the parent process
+    if incomplete:
+        assert os.getpid() in [pid for _, pid in parallel[-1]]
+
+
+def test_worker_death():
+    batches = Batches(Fragments(), {'@': (process, None)}, batch_size=16)
+    files = FILES + [{'uri': 'kill', 'n': 1}]
+    with pytest.raises(RuntimeError, match='died'):
+        list(batches.from_files(files, n_workers=2))
+
+
+def test_spawn():
+    code = '\n'.join([
+        'import multiprocessing',
+        'from pyannote.core import Segment',
+        'from pyannote.generators.batch import FileBasedBatchGenerator',
+        'from pyannote.generators.fragment import SlidingSegments',
+        'if __name__ == "__main__":',
+        '    multiprocessing.set_start_method("spawn")',
+        '    generator = SlidingSegments(duration=2., step=1.,',
+        '                                source=Segment(0, 10))',
+        '    batches = FileBasedBatchGenerator(',
+        '        generator, {"@": (None, None)}, batch_size=4)',
+        '    files = [{"uri": str(i)} for i in range(5)]',
+        '    batches = list(batches.from_files(files, n_workers=2,',
+        '                                      incomplete=True))',
+        '    print(sum(len(batch) for batch in batches))',
+    ])
+    output = subprocess.check_output([sys.executable, '-c', code],
+                                     universal_newlines=True)
+    assert int(output.strip().splitlines()[-1]) == 5 * 9
+
+
+def test_parallel_stats(tmpdir):
+    path = str(tmpdir.join('stats.json'))
+    batches = Batches(Fragments(), {'@': (process, None)}, batch_size=16)
+    start_reporting(path, interval=3600.)
+    try:
+        parallel = list(batches.from_files(FILES, incomplete=True,
+                                           n_workers=3))
+    finally:
+        stop_reporting()
+
+    with open(path, 'r') as fp:
+        report = json.load(fp)
+    assert report['files'] == len(FILES)
+    assert report['batches'] == len(parallel)
+    assert report['items'] == sum(len(batch) for batch in parallel)
+
+
+def test_parallel_durations(tmpdir):
+    path = str(tmpdir.join('durations.json'))
+    files = []
+    for i in range(4):
+        audio = str(tmpdir.join('file{i}.wav'.format(i=i)))
+        with open(audio, 'w') as fp:
+            fp.write('audio')
+        files.append({'uri': 'file{i}'.format(i=i), 'audio': audio})
+
+    calls = []
+
+    def get_duration(current_file):
+        calls.append(current_file['uri'])
+        return 5.
+
+    durations = DurationIndex(path, get_duration=get_duration)
+    generator = SlidingSegments(duration=2., step=1., source='audio',
+                                durations=durations)
+    batches = FileBasedBatchGenerator(generator, {'@': (None, None)},
+                                      batch_size=4)
+    parallel = list(batches.from_files(files, n_workers=2, incomplete=True))
+    assert sum(len(batch) for batch in parallel) == 4 * 4
+
+    # durations were looked up once, and saved, by the parent process
+    assert sorted(calls) == [f['uri'] for f in files]
+    with open(path, 'r') as fp:
+        assert len(json.load(fp)['durations']) == len(files)
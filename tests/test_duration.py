@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import gc
+import os
+import sys
+import json
+import weakref
+import subprocess
+from pyannote.generators.duration import DurationIndex
+
+
+def fake_duration(calls):
+    def get_duration(current_file):
+        calls.append(current_file['uri'])
+        return 10.
+    return get_duration
+
+
+def make_files(tmpdir, n=3):
+    files = []
+    for i in range(n):
+        audio = os.path.join(str(tmpdir), 'file{i}.wav'.format(i=i))
+        with open(audio, 'w') as fp:
+            fp.write('audio')
+        files.append({'uri': 'file{i}'.format(i=i), 'audio': audio})
+    return files
+
+
+def test_save_every(tmpdir):
+    path = os.path.join(str(tmpdir), 'durations.json')
+    files = make_files(tmpdir)
+    calls = []
+    durations = DurationIndex(path, get_duration=fake_duration(calls),
+                              save_every=2)
+    durations(files[0])
+    assert not os.path.exists(path)
+    durations(files[1])
+    assert len(json.load(open(path))['durations']) == 2
+
+    # durations are read from disk, audio files are not opened again
+    calls = []
+    durations = DurationIndex(path, get_duration=fake_duration(calls))
+    assert durations(files[0]) == 10. and durations(files[1]) == 10.
+    assert not calls
+
+
+def test_save_at_exit(tmpdir):
+    path = os.path.join(str(tmpdir), 'durations.json')
+    code = '\n'.join([
+        'from pyannote.generators.duration import DurationIndex',
+        'durations = DurationIndex({path!r}, get_duration=lambda f: 3.)',
+        'durations({{"uri": "file", "audio": {audio!r}}})',
+    ]).format(path=path, audio=make_files(tmpdir, n=1)[0]['audio'])
+    subprocess.check_call([sys.executable, '-c', code])
+    assert json.load(open(path))['durations']['file'][2] == 3.
+
+
+def test_stat_every(tmpdir, monkeypatch):
+    files = make_files(tmpdir, n=1)
+    durations = DurationIndex(get_duration=fake_duration([]))
+
+    n_stats = [0]
+    stat = os.stat
+
+    def counting_stat(*args, **kwargs):
+        n_stats[0] += 1
+        return stat(*args, **kwargs)
+
+    monkeypatch.setattr(os, 'stat', counting_stat)
+    for _ in range(10):
+        durations(files[0])
+    assert n_stats[0] == 1
+
+
+def test_save_merges(tmpdir):
+    """Indices sharing the same file do not overwrite each other"""
+
+    path = os.path.join(str(tmpdir), 'durations.json')
+    files = make_files(tmpdir)
+    first = DurationIndex(path, get_duration=fake_duration([]))
+    second = DurationIndex(path, get_duration=fake_duration([]))
+    first(files[0])
+    second(files[1])
+    first.save()
+    second.save()
+    assert sorted(json.load(open(path))['durations']) == ['file0', 'file1']
+
+    # entries saved by others are picked up on next save
+    first(files[2])
+    first.save()
+    calls = []
+    first.get_duration = fake_duration(calls)
+    first(files[1])
+    assert not calls
+
+
+def test_not_kept_alive(tmpdir):
+    """Exit hook does not keep indices alive"""
+
+    path = os.path.join(str(tmpdir), 'durations.json')
+    durations = DurationIndex(path, get_duration=fake_duration([]))
+    reference = weakref.ref(durations)
+    del durations
+    gc.collect()
+    assert reference() is None
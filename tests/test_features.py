@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import os
+import numpy as np
+import pytest
+from pyannote.core import Segment, SlidingWindow
+from pyannote.generators.features import MemmapFeatures
+
+
+@pytest.fixture
+def features(tmpdir):
+    frames = SlidingWindow(start=0., duration=0.025, step=0.010)
+    np.save(os.path.join(str(tmpdir), 'long.npy'),
+            np.random.rand(1000, 5).astype(np.float32))
+    np.save(os.path.join(str(tmpdir), 'short.npy'),
+            np.random.rand(10, 5).astype(np.float32))
+    return MemmapFeatures(str(tmpdir), frames, duration=1.)
+
+
+def test_pack_empty_batch(features):
+    features.preprocess({'uri': 'long'})
+    packed = features.pack([])
+    assert packed.shape == (0, features.n_frames, 5)
+    assert packed.dtype == np.float32
+
+
+def test_short_file(features):
+    with pytest.raises(ValueError):
+        features.preprocess({'uri': 'short'})
+    short = np.load(features.get_path({'uri': 'short'}), mmap_mode='r')
+    with pytest.raises(ValueError):
+        features.get_start_frame(Segment(0., 1.), short)
+
+
+def test_pack(features):
+    current_file = features.preprocess({'uri': 'long'})
+    segments = [Segment(0., 1.), Segment(9.5, 10.5), Segment(2., 3.)]
+    batch = [features.process(s, current_file=current_file)
+             for s in segments]
+    packed = features.pack(batch)
+    assert packed.shape == (3, features.n_frames, 5)
+    for crop, segment in zip(packed, segments):
+        np.testing.assert_array_equal(
+            crop, features.crop(segment, current_file))
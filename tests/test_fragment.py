@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import numpy as np
+from pyannote.core import Segment, Timeline, Annotation
+from pyannote.generators.fragment import SlidingSegments
+from pyannote.generators.fragment import SlidingLabeledSegments
+
+
+def random_annotation(rng, n_tracks=40, duration=100.):
+    annotation = Annotation(uri='file')
+    for t in range(n_tracks):
+        start = rng.rand() * duration
+        segment = Segment(start, start + rng.rand() * 10.)
+        annotation[segment, t] = 'ABC'[rng.randint(3)]
+    return annotation
+
+
+def test_heterogeneous_overlapping_support():
+    """Majority labels match Annotation.argmax on overlapping supports"""
+
+    rng = np.random.RandomState(0)
+    support = Timeline([Segment(0, 50), Segment(20, 80), Segment(60, 110)],
+                       uri='file')
+
+    for _ in range(20):
+        annotation = random_annotation(rng)
+        current_file = {'uri': 'file', 'annotation': annotation,
+                        'annotated': support}
+        generator = SlidingLabeledSegments(duration=3., step=1.,
+                                           heterogeneous=True,
+                                           source='annotated')
+
+        # baseline: one call to Annotation.argmax per window
+        expected = annotation.support()
+        for gap in expected.get_timeline().gaps(support=support):
+            expected[gap] = None
+        windows = SlidingSegments(duration=3., step=1.)
+        expected = [(segment, expected.argmax(support=segment))
+                    for segment in windows.iter_segments(support)]
+
+        assert list(generator.from_file(current_file)) == expected
+
+
+def test_count_segments():
+    """count_segments matches the length of iter_segments"""
+
+    rng = np.random.RandomState(1)
+    annotation = random_annotation(rng, n_tracks=100)
+
+    for heterogeneous in [False, True]:
+        for min_duration in [None, 0.5]:
+            generator = SlidingLabeledSegments(duration=2., step=0.5,
+                                               heterogeneous=heterogeneous,
+                                               min_duration=min_duration,
+                                               source='support')
+            expected = len(list(generator.iter_segments(annotation)))
+            assert generator.count_segments(annotation) == expected
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import sys
+import subprocess
+import pytest
+
+
+HEAVY = ['pyannote.core', 'pyannote.database']
+
+# all modules but `fragment` (which imports pyannote.core eagerly)
+LIGHT = ['pyannote.generators',
+         'pyannote.generators.alias',
+         'pyannote.generators.background',
+         'pyannote.generators.batch',
+         'pyannote.generators.cache',
+         'pyannote.generators.corpus',
+         'pyannote.generators.duration',
+         'pyannote.generators.features',
+         'pyannote.generators.indices',
+         'pyannote.generators.rng',
+         'pyannote.generators.segment',
+         'pyannote.generators.stats',
+         'pyannote.generators.trace']
+
+
+def run(code):
+    """Run `code` in a fresh interpreter and return its standard output"""
+    return subprocess.check_output([sys.executable, '-c', code],
+                                   universal_newlines=True).strip()
+
+
+@pytest.mark.parametrize('module', LIGHT)
+def test_lazy_import(module):
+    """Importing `module` does not load heavy dependencies"""
+    loaded = run('import sys, {module}; print(",".join(sorted(sys.modules)))'
+                 .format(module=module)).split(',')
+    for heavy in HEAVY:
+        assert heavy not in loaded
+
+
+def test_import_time():
+    """Importing the package is (much) faster than importing pyannote.core"""
+
+    code = ('import time; t = time.perf_counter(); import {module}; '
+            'print(time.perf_counter() - t)')
+    package = min(float(run(code.format(module='pyannote.generators')))
+                  for _ in range(3))
+    core = min(float(run(code.format(module='pyannote.core')))
+               for _ in range(3))
+    assert package < .5 * core
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import os
+import numpy as np
+import pytest
+from pyannote.generators.indices import index_labels
+from pyannote.generators.indices import random_label_index
+from pyannote.generators.indices import random_label_batches
+from pyannote.generators.indices import LabelIndex
+
+
+def check_index(y, index):
+    unique, counts, sequences, offsets = index
+    for code, label in enumerate(unique):
+        expected = np.where(np.asarray(y) == label)[0]
+        np.testing.assert_array_equal(
+            np.sort(sequences[offsets[code]:offsets[code + 1]]), expected)
+
+
+def test_stored_index(tmpdir):
+    root_dir = str(tmpdir)
+    rng = np.random.RandomState(0)
+
+    y = rng.randint(10, size=1000)
+    check_index(y, index_labels(y, root_dir=root_dir))
+    # reopened as is
+    check_index(y, index_labels(y, root_dir=root_dir))
+
+    # different labels with the same length: index is rebuilt
+    z = rng.randint(10, size=1000)
+    with pytest.warns(UserWarning, match='Rebuilding'):
+        index = index_labels(z, root_dir=root_dir)
+    check_index(z, index)
+
+
+def test_stored_index_single_change(tmpdir):
+    """Changing a single label is enough to rebuild the index"""
+
+    root_dir = str(tmpdir)
+    y = np.random.RandomState(0).randint(100, size=1000000)
+    index_labels(y, root_dir=root_dir)
+
+    z = np.array(y)
+    z[7] = (z[7] + 1) % 100
+    with pytest.warns(UserWarning, match='Rebuilding'):
+        check_index(z, index_labels(z, root_dir=root_dir))
+
+
+def test_stored_index_memmap(tmpdir):
+    """Memory-mapped labels are identified by their file"""
+
+    root_dir = str(tmpdir.mkdir('index'))
+    path = str(tmpdir.join('y.npy'))
+    rng = np.random.RandomState(0)
+
+    np.save(path, rng.randint(10, size=1000))
+    y = np.load(path, mmap_mode='r')
+    check_index(y, index_labels(y, root_dir=root_dir))
+    check_index(y, index_labels(y, root_dir=root_dir))
+
+    stat = os.stat(path)
+    np.save(path, rng.randint(10, size=1000))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    z = np.load(path, mmap_mode='r')
+    with pytest.warns(UserWarning, match='Rebuilding'):
+        check_index(z, index_labels(z, root_dir=root_dir))
+
+
+def test_stored_index_version(tmpdir):
+    """Explicit version keys are used instead of labels"""
+
+    root_dir = str(tmpdir)
+    rng = np.random.RandomState(0)
+    y = rng.randint(10, size=1000)
+    z = rng.randint(10, size=1000)
+
+    index_labels(y, root_dir=root_dir, version='v1')
+    # same version: stored index is reused as is
+    check_index(y, index_labels(z, root_dir=root_dir, version='v1'))
+    with pytest.warns(UserWarning, match='Rebuilding'):
+        check_index(z, index_labels(z, root_dir=root_dir, version='v2'))
+
+
+def test_rebuild_keeps_mapped_index(tmpdir):
+    """Rebuilding an index does not alter previously mapped ones"""
+
+    root_dir = str(tmpdir)
+    rng = np.random.RandomState(0)
+
+    y = rng.randint(10, size=1000)
+    index = index_labels(y, root_dir=root_dir)
+    z = rng.randint(10, size=1000)
+    with pytest.warns(UserWarning, match='Rebuilding'):
+        index_labels(z, root_dir=root_dir)
+    check_index(y, index)
+
+
+def reference_label_index(y, per_label=3, repeat=True):
+    """Original per-label implementation of `random_label_index`"""
+
+    unique, y, counts = np.unique(y, return_inverse=True, return_counts=True)
+    n_labels = len(unique)
+    shuffled_sequences = [np.where(y == label)[0] for label in range(n_labels)]
+    consumed = [0 for label in range(n_labels)]
+    previous_label = None
+    while True:
+        for k, label in enumerate(np.random.choice(n_labels,
+                                                   size=n_labels,
+                                                   replace=False)):
+            if k == 0 and label == previous_label:
+                continue
+            per_this_label = per_label if repeat \
+                else min(per_label, counts[label])
+            for _ in range(per_this_label):
+                yield shuffled_sequences[label][consumed[label]]
+                consumed[label] += 1
+                if consumed[label] + 1 > counts[label]:
+                    consumed[label] = 0
+                    np.random.shuffle(shuffled_sequences[label])
+        previous_label = label
+
+
+def take(iterable, n):
+    return np.array([next(iterable) for _ in range(n)])
+
+
+@pytest.mark.parametrize('n_labels', [2, 3, 20])
+@pytest.mark.parametrize('repeat', [True, False])
+def test_same_as_reference(n_labels, repeat):
+    """Seeded samplers yield the same indices as the original one"""
+
+    # single-label y is excluded: the original implementation stalls
+    y = np.random.RandomState(1).randint(n_labels, size=200)
+    n = 2000
+
+    np.random.seed(0)
+    expected = take(reference_label_index(y, per_label=4, repeat=repeat), n)
+
+    np.random.seed(0)
+    indices = random_label_index(y, per_label=4, repeat=repeat)
+    np.testing.assert_array_equal(take(indices, n), expected)
+
+    np.random.seed(0)
+    batches = random_label_batches(y, per_label=4, batch_size=7,
+                                   repeat=repeat)
+    np.testing.assert_array_equal(
+        np.hstack([next(batches) for _ in range(n // 7 + 1)])[:n], expected)
+
+    np.random.seed(0)
+    index = LabelIndex(y, per_label=4, repeat=repeat)
+    np.testing.assert_array_equal(take(index.iter_indices(), n), expected)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import itertools
+import numpy as np
+import pytest
+from pyannote.core import Segment, Annotation
+from pyannote.generators.fragment import RandomSegments
+from pyannote.generators.fragment import RandomSegmentTriplets
+
+
+def get_files(n_files=4):
+    rng = np.random.RandomState(0)
+    files = []
+    for f in range(n_files):
+        annotation = Annotation(uri=str(f))
+        for t in range(20):
+            start = rng.rand() * 100.
+            segment = Segment(start, start + 5. + rng.rand() * 10.)
+            annotation[segment, t] = 'ABCD'[rng.randint(4)]
+        files.append({'uri': str(f), 'annotation': annotation})
+    return files
+
+
+@pytest.mark.parametrize('get_generator', [
+    lambda: RandomSegments(duration=2., batch_size=8, rng=42),
+    lambda: RandomSegmentTriplets(duration=2., per_label=3, rng=42)])
+def test_file_order(get_generator):
+    """Seeded generators yield the same output per file in any order"""
+
+    files = get_files()
+
+    def per_file(files):
+        generator = get_generator()
+        return {current_file['uri']: list(itertools.islice(
+                    generator.from_file(current_file), 20))
+                for current_file in files}
+
+    assert per_file(files) == per_file(files[::-1])
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import json
+import numpy as np
+import pytest
+from pyannote.generators.batch import FileBasedBatchGenerator
+from pyannote.generators.background import BackgroundGenerator
+from pyannote.generators.stats import StatsReporter
+from pyannote.generators.stats import start_reporting, stop_reporting
+
+
+class Fragments(object):
+    def from_file(self, current_file):
+        for i in range(current_file['n']):
+            yield np.full(4, i, dtype=np.float32)
+
+
+FILES = [{'uri': 'file{i}'.format(i=i), 'n': 10} for i in range(3)]
+
+
+@pytest.mark.parametrize('format', ['json', 'prometheus'])
+def test_report(tmpdir, format):
+    path = str(tmpdir.join('stats'))
+    batches = FileBasedBatchGenerator(Fragments(), {'@': (None, None)},
+                                      batch_size=8)
+    start_reporting(path, interval=3600., format=format)
+    try:
+        for _ in BackgroundGenerator(batches.from_files(FILES)):
+            pass
+    finally:
+        stop_reporting()
+
+    with open(path, 'r') as fp:
+        content = fp.read()
+
+    # 30 items, 3 complete batches of 8 items, 16 bytes per item
+    expected = {'files': 3, 'failures': 0, 'batches': 3, 'items': 24,
+                'bytes_put': 24 * 16, 'bytes_got': 24 * 16}
+
+    if format == 'json':
+        report = json.loads(content)
+        for name, value in expected.items():
+            assert report[name] == value
+        return
+
+    lines = content.splitlines()
+    for name, value in expected.items():
+        metric = 'pyannote_generators_{0}_total'.format(name)
+        assert '# TYPE {0} counter'.format(metric) in lines
+        assert '{0} {1}'.format(metric, value) in lines
+    assert '# TYPE pyannote_generators_queue_fill gauge' in lines
+    for name in StatsReporter.RATES:
+        metric = 'pyannote_generators_{0}_per_second'.format(name)
+        assert '# TYPE {0} gauge'.format(metric) in lines
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2018 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+
+
+
+import json
+import numpy as np
+from pyannote.generators.batch import FileBasedBatchGenerator
+from pyannote.generators.background import BackgroundGenerator
+from pyannote.generators.trace import start_tracing, stop_tracing
+
+
+class Fragments(object):
+    def from_file(self, current_file):
+        for i in range(current_file['n']):
+            yield np.full(4, i, dtype=np.float32)
+
+
+FILES = [{'uri': 'file{i}'.format(i=i), 'n': 10} for i in range(3)]
+
+
+def test_trace(tmpdir):
+    path = str(tmpdir.join('trace.json'))
+    batches = FileBasedBatchGenerator(Fragments(), {'@': (None, None)},
+                                      batch_size=8)
+    start_tracing()
+    try:
+        for _ in BackgroundGenerator(batches.from_files(FILES)):
+            pass
+    finally:
+        stop_tracing(path)
+
+    with open(path, 'r') as fp:
+        events = json.load(fp)['traceEvents']
+    names = set(event['name'] for event in events)
+    assert {'preprocess', 'pack', 'put', 'get'} <= names
+
+    # one preprocess span per file, one pack span per batch
+    preprocess = [e for e in events if e['name'] == 'preprocess']
+    assert len(preprocess) == len(FILES)
+    assert len([e for e in events if e['name'] == 'pack']) == 3